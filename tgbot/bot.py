@@ -1,12 +1,65 @@
 import asyncio
+import os
+from typing import Optional
+
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.filters import Command, StateFilter
+from aiogram.types import (
+    Message,
+    ReplyKeyboardMarkup,
+    KeyboardButton,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    BufferedInputFile,
+)
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from tgbot.settings import API_TOKEN
-from tgbot.parse_tools import get_search_list_db
+from tgbot.parse_tools import (
+    EDITION_MATCH,
+    EXACT_MATCH,
+    get_search_list_db,
+    load_prefix_index,
+    match_rank,
+)
+from tgbot.search_index import PrefixIndex
+from tgbot.data_sources import close_client_session
+from tgbot.documents import aget_document, read_document, remember_file_id
+from tgbot.fulltext import search_passages
+from tgbot.models import init_db
+from tgbot.normalize import normalize_text
+from tgbot.references import referenced_by, references_of, replaced_by, replaces
+from tgbot.subscriptions import list_subscriptions, split_message, subscribe, unsubscribe
+from tgbot.storage import (
+    REDIS_URL,
+    BaseCache,
+    create_cache,
+    create_fsm_storage,
+    create_redis,
+)
+
+
+# Optional catalog snapshot shared (memory-mapped) by all bot processes
+SNAPSHOT_PATH = os.environ.get('GOSTBOT_SNAPSHOT')
+# When set, the bot receives updates through a webhook instead of polling
+WEBHOOK_URL = os.environ.get('GOSTBOT_WEBHOOK_URL')
+WEBHOOK_PATH = os.environ.get('GOSTBOT_WEBHOOK_PATH', '/webhook')
+WEBHOOK_HOST = os.environ.get('GOSTBOT_WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('GOSTBOT_WEBHOOK_PORT', 80))
+
+
+# Search results sent per query, best matches first
+SEARCH_RESULTS_LIMIT = 10
+# Telegram allows at most 50 inline results per answer
+INLINE_RESULTS_LIMIT = 20
+# How long Telegram may cache inline answers on its side, in seconds
+INLINE_CACHE_TIME = 300
+# Full-text search: passages shown per query and their maximum length
+FULLTEXT_RESULTS_LIMIT = 5
+PASSAGE_PREVIEW_CHARS = 600
+# Standards listed per section of /refs and /replaced
+GRAPH_RESULTS_LIMIT = 50
 
 
 class GostStates(StatesGroup):
@@ -36,17 +89,30 @@ async def search_gost(message: Message, state: FSMContext):
     await state.set_state(GostStates.typing_reply)
 
 
-async def received_information(message: Message, state: FSMContext):
+async def cached_search(search_cache: BaseCache, text: str) -> list:
+    """Search the database, sharing results between replicas via the cache."""
+    key = 'search:' + normalize_text(text)
+    gost_list = await search_cache.get(key)
+    if gost_list is None:
+        gost_list = [[gost.name, gost.description]
+                     for gost in get_search_list_db(text, lean=True,
+                                                    limit=SEARCH_RESULTS_LIMIT)]
+        await search_cache.set(key, gost_list)
+    return gost_list
+
+
+async def received_information(message: Message, state: FSMContext,
+                               search_cache: BaseCache):
     text = message.text
-    gost_list = get_search_list_db(text)
+    gost_list = await cached_search(search_cache, text)
 
     await state.update_data(search_string=None)
     await message.answer('Вот все что удалось найти',
                          reply_markup=reply_keyboard)
-    for gost in gost_list:
-        await message.answer(gost.name +
+    for name, description in gost_list:
+        await message.answer(name +
                              '\n' +
-                             gost.description,
+                             description,
                              reply_markup=reply_keyboard)
 
     await state.set_state(GostStates.choosing)
@@ -56,13 +122,224 @@ async def done(message: Message, state: FSMContext):
     await state.clear()
 
 
-async def main():
-    # Create the Bot and Dispatcher
-    bot = Bot(token=API_TOKEN)
-    dp = Dispatcher()
+async def send_document(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Укажите обозначение стандарта, например: /doc ГОСТ 2.105-95')
+        return
+
+    name = find_gost(command.args)
+    if name is None:
+        await message.answer('Стандарт не найден, укажите полное обозначение, '
+                             'например: ГОСТ 2.105-95')
+        return
+
+    document = await aget_document(name)
+    if document is None:
+        await message.answer('Текст стандарта не найден')
+        return
+
+    # Already uploaded once: Telegram serves it by file_id
+    if document.file_id:
+        await message.answer_document(document.file_id)
+        return
+
+    content = read_document(document)
+    if content is None:
+        await message.answer('Текст стандарта не найден')
+        return
+    sent = await message.answer_document(
+        BufferedInputFile(content, filename=document.filename)
+    )
+    remember_file_id(document, sent.document.file_id)
+
+
+async def search_fulltext(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Опишите требование, например: /text допуски на размеры резьбы')
+        return
+
+    hits = search_passages(command.args, limit=FULLTEXT_RESULTS_LIMIT)
+    if not hits:
+        await message.answer('Ничего не найдено в текстах стандартов')
+        return
+
+    for hit in hits:
+        text = hit.text
+        if len(text) > PASSAGE_PREVIEW_CHARS:
+            text = text[:PASSAGE_PREVIEW_CHARS] + '…'
+        await message.answer(hit.gost_name + '\n' + text)
+
+
+async def subscribe_gost(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Укажите обозначение стандарта, например: /subscribe ГОСТ 2.105-95')
+        return
+
+    name = find_gost(command.args)
+    if name is None:
+        await message.answer('Стандарт не найден, укажите полное обозначение, '
+                             'например: ГОСТ 2.105-95')
+        return
+
+    if subscribe(message.chat.id, name):
+        await message.answer(f'Сообщу, когда {name} изменится')
+    else:
+        await message.answer(f'Вы уже подписаны на {name}')
+
+
+async def unsubscribe_gost(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Укажите обозначение стандарта, например: /unsubscribe ГОСТ 2.105-95')
+        return
+
+    if unsubscribe(message.chat.id, command.args):
+        await message.answer('Подписка отменена')
+    else:
+        await message.answer('Вы не подписаны на этот стандарт')
+
+
+async def show_subscriptions(message: Message):
+    names = list_subscriptions(message.chat.id)
+    if not names:
+        await message.answer('Подписок нет. Подписаться: /subscribe ГОСТ 2.105-95')
+        return
+    await message.answer('Ваши подписки:\n' + '\n'.join(names))
+
+
+def find_gost(text: str, max_rank: int = EXACT_MATCH) -> Optional[str]:
+    """
+    Catalog name of the GOST a designation means.
+
+    Args:
+        text: Designation typed by the user.
+        max_rank: Worst match tier accepted (see parse_tools.match_rank()).
+
+    Returns:
+        The best match's name, or None if it is not a designation match
+        within max_rank, so commands never act on a GOST that merely
+        contains the text.
+    """
+    matches = get_search_list_db(text, lean=True, limit=1)
+    if matches:
+        rank = match_rank(normalize_text(text), normalize_text(matches[0].name),
+                          normalize_text(matches[0].description))
+        if rank <= max_rank:
+            return matches[0].name
+    return None
+
+
+def resolve_designation(text: str) -> str:
+    """
+    Catalog name of the GOST a designation means, for the reference graph.
+
+    Withdrawn standards are often not in the catalog but still in the
+    reference graph, so a text that matches no designation is used as is
+    rather than resolved to a GOST that merely mentions it.
+    """
+    return find_gost(text, EDITION_MATCH) or text.strip()
+
+
+def _graph_section(title: str, names: list) -> str:
+    lines = [title] + names[:GRAPH_RESULTS_LIMIT]
+    if len(names) > GRAPH_RESULTS_LIMIT:
+        lines.append(f'… и ещё {len(names) - GRAPH_RESULTS_LIMIT}')
+    return '\n'.join(lines)
+
+
+def _chain_line(name: str, depth: int) -> str:
+    # A flat list: the closure keeps each edition's depth, not its parent
+    return name if depth == 1 else f'{name} (шаг {depth})'
+
+
+async def show_references(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Укажите обозначение стандарта, например: /refs ГОСТ 2.105-95')
+        return
+
+    name = resolve_designation(command.args)
+    outgoing = references_of(name)
+    incoming = referenced_by(name)
+    if not outgoing and not incoming:
+        await message.answer(f'Ссылок для {name} не найдено')
+        return
+
+    sections = [name]
+    if outgoing:
+        sections.append(_graph_section('Ссылается на:', outgoing))
+    if incoming:
+        sections.append(_graph_section('На него ссылаются:', incoming))
+    for text in split_message(sections):
+        await message.answer(text)
+
+
+async def show_replacements(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer('Укажите обозначение стандарта, например: /replaced ГОСТ 2.105-95')
+        return
+
+    name = resolve_designation(command.args)
+    older = replaces(name)
+    newer = replaced_by(name)
+    if not older and not newer:
+        await message.answer(f'Сведений о замене {name} не найдено')
+        return
+
+    sections = [name]
+    if newer:
+        sections.append(_graph_section('Заменён на:', [
+            _chain_line(newer_name, depth) for newer_name, depth in newer]))
+    if older:
+        sections.append(_graph_section('Заменяет:', [
+            _chain_line(older_name, depth) for older_name, depth in older]))
+    for text in split_message(sections):
+        await message.answer(text)
+
+
+async def inline_search(inline_query: InlineQuery, gost_index: PrefixIndex):
+    matches = gost_index.search(inline_query.query, limit=INLINE_RESULTS_LIMIT)
+    results = [
+        InlineQueryResultArticle(
+            id=str(i),
+            title=name,
+            description=description,
+            input_message_content=InputTextMessageContent(
+                message_text=name + '\n' + description
+            )
+        )
+        for i, (name, description) in enumerate(matches)
+    ]
+    await inline_query.answer(results,
+                              cache_time=INLINE_CACHE_TIME,
+                              is_personal=False)
+
+
+def create_dispatcher(storage=None, search_cache: BaseCache = None,
+                      gost_index=None) -> Dispatcher:
+    """
+    Create the Dispatcher with all handlers registered.
+
+    Args:
+        storage: FSM storage, in-memory by default.
+        search_cache: Search result cache, per-process by default.
+        gost_index: Autocomplete index; loaded from the DB (or snapshot) by default.
+
+    Returns:
+        The configured Dispatcher.
+    """
+    dp = Dispatcher(storage=storage or create_fsm_storage())
+    dp['search_cache'] = search_cache or create_cache()
+    # Autocomplete index is built once and shared by all inline queries
+    dp['gost_index'] = gost_index if gost_index is not None else load_prefix_index(SNAPSHOT_PATH)
 
     # Register handlers
     dp.message.register(start, Command('start'))
+    dp.message.register(send_document, Command('doc'))
+    dp.message.register(search_fulltext, Command('text'))
+    dp.message.register(subscribe_gost, Command('subscribe'))
+    dp.message.register(unsubscribe_gost, Command('unsubscribe'))
+    dp.message.register(show_subscriptions, Command('subscriptions'))
+    dp.message.register(show_references, Command('refs'))
+    dp.message.register(show_replacements, Command('replaced'))
     dp.message.register(
         search_gost,
         StateFilter(GostStates.choosing),
@@ -79,9 +356,53 @@ async def main():
         done,
         F.text.regexp(r'^Done$')
     )
+    dp.inline_query.register(inline_search)
+    return dp
+
+
+async def main():
+    from tgbot.settings import API_TOKEN
+
+    # Bring a database stored by an older version up to date (normalized
+    # columns, trigram index) before the first search
+    init_db()
+
+    # Redis, when configured, holds FSM state and the search cache for all replicas
+    redis = create_redis(REDIS_URL) if REDIS_URL else None
+
+    # Create the Bot and Dispatcher
+    bot = Bot(token=API_TOKEN)
+    dp = create_dispatcher(storage=create_fsm_storage(redis),
+                           search_cache=create_cache(redis))
+
+    try:
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            # Start the Bot with polling
+            await dp.start_polling(bot)
+    finally:
+        # The sources' client session, opened by /doc downloads
+        await close_client_session()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Serve updates over a webhook, so replicas can run behind a load balancer."""
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
 
-    # Start the Bot with polling
-    await dp.start_polling(bot)
+    await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 
 if __name__ == '__main__':
@@ -2,25 +2,52 @@
 Script to populate the GOST database from all available data sources.
 
 Usage:
-    python csv_to_sql.py [--source SOURCE_NAME] [--all]
+    python csv_to_sql.py [--source SOURCE_NAME] [--all] [--config PATH]
+                         [--delete-missing] [--notify]
+                         [--export-snapshot PATH [--export-only]]
+                         [--export-parquet PATH]
+                         [--index-documents] [--rebuild-references]
+                         [--profile [--profile-dir DIR] [--profile-memory]]
 
 Options:
-    --source SOURCE_NAME  Fetch from a specific source only
-    --all                 Fetch from all available sources (default)
+    --source SOURCE_NAME    Fetch from a specific source only
+    --config PATH           Per-source settings (see source_config.py)
+    --all                   Fetch from all available sources (default)
+    --delete-missing        Delete GOSTs their source no longer returns; sources
+                            that fail keep theirs (needs pyarrow)
+    --notify                Message subscribers about GOSTs changed by this refresh
+    --export-snapshot PATH  Write a memory-mappable catalog snapshot
+    --export-only           Only export the snapshot(s), do not fetch
+    --export-parquet PATH   Write the catalog as a Parquet file (needs pyarrow)
+    --index-documents       Add cached documents to the full-text index
+    --rebuild-references    Re-extract the cross-reference graph from all descriptions
+    --profile               Time every fetch phase per source and print a report
+    --profile-dir DIR       With --profile, write cProfile dumps per source to DIR
+    --profile-memory        With --profile, record peak memory with tracemalloc
 """
 
 import argparse
+import asyncio
+from datetime import datetime
 import logging
 import sys
 
 from tgbot.data_sources import (
+    configure_sources,
     get_all_data_sources,
     fetch_from_source,
     save_gosts_to_db,
     update_database_from_all_sources,
     GostRuDataSource,
 )
-from tgbot.models import Base, engine
+from tgbot import ingest
+from tgbot.documents import get_document_cache
+from tgbot.fulltext import index_cached_documents
+from tgbot.models import Gost, session, init_db
+from tgbot.references import rebuild_references
+from tgbot.profiling import FetchProfiler, activate as activate_profiler
+from tgbot.snapshot import write_snapshot
+from tgbot.source_config import SourceConfigError
 
 # Set up logging
 logging.basicConfig(
@@ -30,6 +57,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def export_snapshot(path: str) -> int:
+    """
+    Export the database catalog to a snapshot file for search replicas.
+    
+    Args:
+        path: Destination snapshot path.
+        
+    Returns:
+        Number of GOSTs exported.
+    """
+    rows = session.query(Gost.name, Gost.description).order_by(Gost.id)
+    return write_snapshot(rows, path)
+
+
 def main():
     """Main entry point for the database update script."""
     parser = argparse.ArgumentParser(
@@ -51,21 +92,111 @@ def main():
         default=True,
         help='Fetch from all available sources (default)'
     )
+    parser.add_argument(
+        '--index-documents',
+        action='store_true',
+        help='Index cached documents that are not in the full-text index yet, then exit'
+    )
+    parser.add_argument(
+        '--rebuild-references',
+        action='store_true',
+        help='Re-extract replaced and referenced standards from all descriptions, then exit'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Profile each source fetch by phase and print a ranked report'
+    )
+    parser.add_argument(
+        '--profile-dir',
+        metavar='DIR',
+        help='With --profile, write cProfile (and tracemalloc) dumps per source to DIR'
+    )
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='With --profile, record peak memory per source with tracemalloc'
+    )
+    parser.add_argument(
+        '--config',
+        metavar='PATH',
+        help='JSON file with per-source settings (default: $GOSTBOT_SOURCES_CONFIG)'
+    )
+    parser.add_argument(
+        '--export-snapshot',
+        metavar='PATH',
+        help='Write a compact memory-mappable snapshot of the catalog'
+    )
+    parser.add_argument(
+        '--export-only',
+        action='store_true',
+        help='Only export the snapshot(s), skip fetching from sources'
+    )
+    parser.add_argument(
+        '--export-parquet',
+        metavar='PATH',
+        help='Write the catalog as a Parquet file, e.g. to diff later refreshes against'
+    )
+    parser.add_argument(
+        '--notify',
+        action='store_true',
+        help='After fetching, message subscribers about changed or removed GOSTs'
+    )
+    parser.add_argument(
+        '--delete-missing',
+        action='store_true',
+        help='With a full refresh, delete GOSTs that their source no longer returns '
+             '(sources that fail or return nothing keep their GOSTs)'
+    )
     
     args = parser.parse_args()
     
-    # Create database tables if they don't exist
-    Base.metadata.create_all(engine)
+    try:
+        configure_sources(args.config)
+    except SourceConfigError as e:
+        print(f"Error: {e}")
+        return 1
     
     if args.list_sources:
         print("Available data sources:")
-        for source in get_all_data_sources():
-            print(f"  - {source.name}: {source.base_url}")
+        for source in get_all_data_sources(include_disabled=True):
+            status = '' if source.config.enabled else ' (disabled)'
+            print(f"  - {source.name}: {source.base_url}{status}")
+        return 0
+    
+    # Create database tables if they don't exist
+    init_db()
+    
+    if args.index_documents:
+        count = index_cached_documents(get_document_cache())
+        print(f"Indexed {count} documents")
+        return 0
+    
+    if args.rebuild_references:
+        count = rebuild_references()
+        print(f"Extracted {count} cross-references")
         return 0
     
-    if args.source:
-        # Find the specific source
-        sources = get_all_data_sources()
+    profiler = None
+    if args.profile:
+        profiler = FetchProfiler(output_dir=args.profile_dir,
+                                 trace_memory=args.profile_memory)
+        activate_profiler(profiler)
+    
+    if (args.export_parquet or args.delete_missing) and not ingest.HAS_ARROW:
+        print("Error: --export-parquet and --delete-missing require pyarrow "
+              "(pip install -r requirements-arrow.txt)")
+        return 1
+    
+    refresh_started = datetime.utcnow()
+    
+    if args.export_only:
+        if not (args.export_snapshot or args.export_parquet):
+            print("Error: --export-only requires --export-snapshot or --export-parquet PATH")
+            return 1
+    elif args.source:
+        # Find the specific source; an explicit request overrides 'enabled'
+        sources = get_all_data_sources(include_disabled=True)
         source = next((s for s in sources if s.name.lower() == args.source.lower()), None)
         
         if not source:
@@ -82,9 +213,27 @@ def main():
     else:
         # Fetch from all sources
         logger.info("Fetching from all available sources...")
-        count = update_database_from_all_sources()
+        count = update_database_from_all_sources(delete=args.delete_missing)
         print(f"Added {count} new GOSTs from all sources")
     
+    if profiler:
+        activate_profiler(None)
+        print(profiler.report())
+    
+    if args.notify and not args.export_only:
+        from tgbot.subscriptions import run_notifications
+        sent = asyncio.run(run_notifications(refresh_started))
+        print(f"Sent {sent} change notifications")
+    
+    if args.export_snapshot:
+        count = export_snapshot(args.export_snapshot)
+        print(f"Exported {count} GOSTs to {args.export_snapshot}")
+    
+    if args.export_parquet:
+        table = ingest.current_table()
+        ingest.write_parquet(table, args.export_parquet)
+        print(f"Exported {table.num_rows} GOSTs to {args.export_parquet}")
+    
     return 0
 
 
@@ -10,43 +10,158 @@ This module contains parsers for multiple GOST data sources:
 - meganorm.ru - Standards database
 - files.stroyinf.ru - Construction standards database
 - internet-law.ru - Legal database with GOST standards
+
+Scrapers are coroutines sharing one aiohttp session per event loop, so the
+bot and the refresh job can keep many requests in flight at once; the
+synchronous fetch_* functions are thin wrappers running them to completion.
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from importlib import import_module, metadata
+from typing import List, Dict, Optional, Tuple, Type
+from urllib.parse import urljoin
+import asyncio
 import logging
-
-from bs4 import BeautifulSoup
-from lxml import html
-import requests
-
-from tgbot.models import Gost, session, Base, engine
+import mimetypes
+import re
+import threading
+import time
+import weakref
+
+from tgbot import profiling
+from tgbot.lazy import lazy_import
+from tgbot.models import Gost, session, init_db
+from tgbot.normalize import normalize_text
+from tgbot.source_config import SourceConfig, SourcesConfig, load_sources_config
+
+# Scraping dependencies are only loaded once a source actually fetches data
+aiohttp = lazy_import('aiohttp')
+bs4 = lazy_import('bs4')
+html = lazy_import('lxml.html')
 
 logger = logging.getLogger(__name__)
 
+# Entry point group third-party packages use to register their scrapers
+ENTRY_POINT_GROUP = 'gostbot.data_sources'
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.135 Safari/537.36',
     'Accept': '*/*'
 }
 
+# Connections open at once across all sources of one event loop
+MAX_CONNECTIONS = 100
+
+# One aiohttp session (and connection pool) per event loop, shared by all sources
+_client_sessions = weakref.WeakKeyDictionary()
+
+
+def get_client_session():
+    """Get the aiohttp client session of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _client_sessions.get(loop)
+    if client is None or client.closed:
+        client = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+            # Profiling times the session's own DNS lookups
+            trace_configs=[profiling.dns_trace_config()],
+        )
+        _client_sessions[loop] = client
+    return client
+
+
+async def close_client_session():
+    """Close the aiohttp client session of the running event loop, if any."""
+    client = _client_sessions.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def run_sync(coroutine):
+    """
+    Run a coroutine from synchronous code.
+    
+    The coroutine gets its own event loop, whose client session is closed
+    when it finishes. Must not be called from a running event loop; await
+    the async API there instead.
+    """
+    async def runner():
+        try:
+            return await coroutine
+        finally:
+            await close_client_session()
+    return asyncio.run(runner())
+
+
+class FetchedResponse:
+    """Status, headers and body of a completed HTTP response."""
+    
+    __slots__ = ('url', 'status', 'headers', 'content', 'charset')
+    
+    def __init__(self, url: str, status: int, headers, content: bytes,
+                 charset: Optional[str] = None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.charset = charset
+    
+    @property
+    def text(self) -> str:
+        """The body decoded with the charset the server declared (UTF-8 by default)."""
+        return self.content.decode(self.charset or 'utf-8', errors='replace')
+
 
 class GostDataSource(ABC):
-    """Abstract base class for GOST data sources."""
+    """
+    Abstract base class for GOST data sources.
+    
+    Sources implement the coroutine afetch_gosts(); fetch_gosts() runs it
+    from synchronous code. Sources that only implement the synchronous
+    fetch_gosts() (e.g. older plugins) still work: their afetch_gosts()
+    runs it in a worker thread.
+    """
     
     name: str = "Base Source"
     base_url: str = ""
+    timeout: float = 30
+    
+    def __init__(self, config: Optional[SourceConfig] = None):
+        self.config = config or SourceConfig()
+        if self.config.base_url:
+            self.base_url = self.config.base_url
+        if self.config.timeout:
+            self.timeout = self.config.timeout
+        # Semaphores belong to an event loop, so there is one per loop
+        self._slots = weakref.WeakKeyDictionary()
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Runs before ABCMeta collects the abstract methods, so sync-only
+        # sources count as implementing afetch_gosts()
+        if 'fetch_gosts' in cls.__dict__ and getattr(cls.afetch_gosts, '__isabstractmethod__', False):
+            cls.afetch_gosts = GostDataSource._afetch_gosts_in_thread
     
     @abstractmethod
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """
         Fetch GOSTs from the data source.
         
         Returns:
             List of dictionaries with 'name' and 'description' keys.
         """
-        pass
     
-    def get_html(self, url: str, params: Optional[Dict] = None) -> Optional[str]:
+    async def _afetch_gosts_in_thread(self) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self.fetch_gosts)
+    
+    def fetch_gosts(self) -> List[Dict[str, str]]:
+        """Synchronous afetch_gosts(), for code outside an event loop."""
+        return run_sync(self.afetch_gosts())
+    
+    async def aget_html(self, url: str, params: Optional[Dict] = None) -> Optional[str]:
         """
         Helper method to fetch HTML content from a URL.
         
@@ -58,12 +173,139 @@ class GostDataSource(ABC):
             HTML content as string, or None if request failed.
         """
         try:
-            response = requests.get(url, headers=HEADERS, params=params, timeout=30)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
+            response = await self.arequest(url, params)
+            with profiling.phase(self.name, 'decode'):
+                return response.text
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Error fetching {url}: {e}")
             return None
+    
+    def get_html(self, url: str, params: Optional[Dict] = None) -> Optional[str]:
+        """Synchronous aget_html()."""
+        return run_sync(self.aget_html(url, params))
+    
+    async def arequest(self, url: str, params: Optional[Dict] = None) -> FetchedResponse:
+        """
+        Perform a GET request within the source's concurrency and rate limits.
+        
+        Args:
+            url: The URL to fetch.
+            params: Optional query parameters.
+            
+        Returns:
+            The response, with its body read.
+            
+        Raises:
+            aiohttp.ClientError: If the request fails.
+            asyncio.TimeoutError: If the source does not answer in time.
+        """
+        profiler = profiling.get_active()
+        async with self._get_slots():
+            await self._throttle()
+            with profiling.phase(self.name, 'download'):
+                timeout = aiohttp.ClientTimeout(total=self.timeout)
+                async with get_client_session().get(
+                        url, params=params, timeout=timeout,
+                        trace_request_ctx={'source': self.name}) as response:
+                    content = await response.read()
+                    if profiler:
+                        profiler.count(self.name, requests=1, bytes=len(content))
+                    response.raise_for_status()
+                    return FetchedResponse(str(response.url), response.status,
+                                           response.headers, content, response.charset)
+    
+    def request(self, url: str, params: Optional[Dict] = None) -> FetchedResponse:
+        """Synchronous arequest()."""
+        return run_sync(self.arequest(url, params))
+    
+    def make_soup(self, markup: str):
+        """
+        Build a BeautifulSoup tree of a page.
+        
+        Args:
+            markup: HTML content.
+            
+        Returns:
+            The parsed document.
+        """
+        with profiling.phase(self.name, 'parse'):
+            soup = bs4.BeautifulSoup(markup, 'lxml')
+        profiler = profiling.get_active()
+        if profiler:
+            profiler.count_elements(self.name, soup)
+        return soup
+    
+    def absolute_url(self, href: Optional[str]) -> Optional[str]:
+        """Resolve a link found on the source's pages against its base URL."""
+        if not href:
+            return None
+        return urljoin(self.base_url + '/', href)
+    
+    async def afetch_document(self, gost: Dict[str, str]) -> Optional[Tuple[bytes, str, str]]:
+        """
+        Fetch the full text of a GOST from this source.
+        
+        The default implementation downloads the GOST's page on the source;
+        if that page links to a PDF, the PDF is downloaded instead.
+        
+        Args:
+            gost: GOST dictionary with 'name' and, if known, 'url'.
+            
+        Returns:
+            (content, content_type, filename), or None if the document
+            is not available from this source.
+        """
+        url = gost.get('url')
+        if not url:
+            return None
+        
+        try:
+            response = await self.arequest(url)
+            content_type = _content_type(response)
+            if content_type == 'text/html':
+                tree = html.fromstring(response.content)
+                pdf_links = tree.xpath('//a[contains(@href, ".pdf")]/@href')
+                if pdf_links:
+                    response = await self.arequest(urljoin(url, pdf_links[0]))
+                    content_type = 'application/pdf'
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error fetching document {gost['name']} from {self.name}: {e}")
+            return None
+        
+        extension = mimetypes.guess_extension(content_type) or ''
+        filename = re.sub(r'[^\w.-]+', '_', gost['name']).strip('_') + extension
+        return response.content, content_type, filename
+    
+    def fetch_document(self, gost: Dict[str, str]) -> Optional[Tuple[bytes, str, str]]:
+        """Synchronous afetch_document()."""
+        return run_sync(self.afetch_document(gost))
+    
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Semaphore limiting concurrent requests from the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._rate_lock:
+            slots = self._slots.get(loop)
+            if slots is None:
+                slots = self._slots[loop] = asyncio.Semaphore(self.config.concurrency)
+            return slots
+    
+    async def _throttle(self):
+        """Wait as long as needed to respect the configured rate limit."""
+        if not self.config.rate_limit:
+            return
+        # Reserve the next free slot first, so concurrent requests queue up
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + 1 / self.config.rate_limit
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _content_type(response) -> str:
+    """Media type of a response without parameters, e.g. 'text/html'."""
+    header = response.headers.get('Content-Type') or 'application/octet-stream'
+    return header.split(';')[0].strip().lower()
 
 
 class GostRuDataSource(GostDataSource):
@@ -76,21 +318,18 @@ class GostRuDataSource(GostDataSource):
     
     name = "gost.ru"
     base_url = "https://www.gost.ru"
+    timeout = 60
     opendata_url = "/opendata/7706406291-nationalstandards"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from gost.ru open data portal."""
         gosts = []
         
         try:
-            page = requests.get(
-                self.base_url + self.opendata_url,
-                headers=HEADERS,
-                timeout=30
-            )
-            page.raise_for_status()
-            
-            tree = html.fromstring(page.content)
+            page = await self.arequest(self.base_url + self.opendata_url)
+            
+            with profiling.phase(self.name, 'parse'):
+                tree = html.fromstring(page.content)
             # Find the CSV file link using the XPath pattern
             csv_links = tree.xpath('//*[@id="242b6628-20e0-459f-b512-2fe12015e7eb"]/div/div[1]/div[5]/div[1]/a/@href')
             
@@ -103,11 +342,11 @@ class GostRuDataSource(GostDataSource):
                 if not csv_url.startswith('http'):
                     csv_url = self.base_url + csv_url
                 
-                file_response = requests.get(csv_url, headers=HEADERS, timeout=60)
-                file_response.raise_for_status()
+                file_response = await self.arequest(csv_url)
                 
                 # Parse CSV content (CP1251 encoding for Russian)
-                content = file_response.content.decode('cp1251').splitlines()
+                with profiling.phase(self.name, 'decode'):
+                    content = file_response.content.decode('cp1251').splitlines()
                 
                 for i in range(1, len(content)):
                     data = content[i].split(";")
@@ -119,7 +358,7 @@ class GostRuDataSource(GostDataSource):
                         
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
             
-        except requests.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Error fetching from {self.name}: {e}")
         except Exception as e:
             logger.error(f"Error parsing data from {self.name}: {e}")
@@ -139,16 +378,16 @@ class DocsCntdRuDataSource(GostDataSource):
     base_url = "https://docs.cntd.ru"
     catalog_url = "/document/gost"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from docs.cntd.ru catalog."""
         gosts = []
         
-        html_content = self.get_html(self.base_url + self.catalog_url)
+        html_content = await self.aget_html(self.base_url + self.catalog_url)
         if not html_content:
             return gosts
         
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = self.make_soup(html_content)
             
             # Parse GOST items from the catalog
             items = soup.find_all('div', class_='doc-item') or \
@@ -167,7 +406,8 @@ class DocsCntdRuDataSource(GostDataSource):
                     if name and 'ГОСТ' in name.upper():
                         gosts.append({
                             'name': name,
-                            'description': description
+                            'description': description,
+                            'url': self.absolute_url(title_elem.get('href'))
                         })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -190,16 +430,16 @@ class MeganormRuDataSource(GostDataSource):
     base_url = "https://meganorm.ru"
     gost_url = "/Index2/1/4294817/4294817904.htm"  # GOST category
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from meganorm.ru."""
         gosts = []
         
-        html_content = self.get_html(self.base_url + self.gost_url)
+        html_content = await self.aget_html(self.base_url + self.gost_url)
         if not html_content:
             return gosts
         
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = self.make_soup(html_content)
             
             # Parse GOST links from the page
             rows = soup.find_all('tr')
@@ -217,7 +457,8 @@ class MeganormRuDataSource(GostDataSource):
                     
                     gosts.append({
                         'name': name,
-                        'description': description
+                        'description': description,
+                        'url': self.absolute_url(link.get('href'))
                     })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -240,7 +481,7 @@ class ProtectGostRuDataSource(GostDataSource):
     base_url = "https://protect.gost.ru"
     search_url = "/v.aspx"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from protect.gost.ru."""
         gosts = []
         
@@ -248,14 +489,16 @@ class ProtectGostRuDataSource(GostDataSource):
             # This source requires specific queries
             # We'll search for common GOST prefixes
             prefixes = ['ГОСТ Р', 'ГОСТ']
+            pages = await asyncio.gather(*(
+                self.aget_html(self.base_url + self.search_url, {'s': prefix})
+                for prefix in prefixes
+            ))
             
-            for prefix in prefixes:
-                params = {'s': prefix}
-                html_content = self.get_html(self.base_url + self.search_url, params)
+            for html_content in pages:
                 if not html_content:
                     continue
                 
-                soup = BeautifulSoup(html_content, 'lxml')
+                soup = self.make_soup(html_content)
                 
                 # Parse search results
                 results = soup.find_all('div', class_='result-item') or \
@@ -271,7 +514,8 @@ class ProtectGostRuDataSource(GostDataSource):
                         
                         gosts.append({
                             'name': name,
-                            'description': description
+                            'description': description,
+                            'url': self.absolute_url(title_elem.get('href'))
                         })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -294,16 +538,16 @@ class FilesStroyinfRuDataSource(GostDataSource):
     base_url = "https://files.stroyinf.ru"
     gost_url = "/cat/Gosts.html"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from files.stroyinf.ru."""
         gosts = []
         
-        html_content = self.get_html(self.base_url + self.gost_url)
+        html_content = await self.aget_html(self.base_url + self.gost_url)
         if not html_content:
             return gosts
         
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = self.make_soup(html_content)
             
             # Parse GOST links from the catalog
             links = soup.find_all('a')
@@ -323,7 +567,8 @@ class FilesStroyinfRuDataSource(GostDataSource):
                     
                     gosts.append({
                         'name': text,
-                        'description': description
+                        'description': description,
+                        'url': self.absolute_url(link.get('href'))
                     })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -346,16 +591,16 @@ class InternetLawRuDataSource(GostDataSource):
     base_url = "https://internet-law.ru"
     gost_url = "/gosts/"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from internet-law.ru."""
         gosts = []
         
-        html_content = self.get_html(self.base_url + self.gost_url)
+        html_content = await self.aget_html(self.base_url + self.gost_url)
         if not html_content:
             return gosts
         
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = self.make_soup(html_content)
             
             # Parse GOST items
             items = soup.find_all('div', class_='gost-item') or \
@@ -373,7 +618,8 @@ class InternetLawRuDataSource(GostDataSource):
                     if 'ГОСТ' in name.upper():
                         gosts.append({
                             'name': name,
-                            'description': description
+                            'description': description,
+                            'url': self.absolute_url(link.get('href'))
                         })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -396,16 +642,16 @@ class LibGostRuDataSource(GostDataSource):
     base_url = "http://libgost.ru"
     gost_url = "/gost/"
     
-    def fetch_gosts(self) -> List[Dict[str, str]]:
+    async def afetch_gosts(self) -> List[Dict[str, str]]:
         """Fetch GOSTs from libgost.ru."""
         gosts = []
         
-        html_content = self.get_html(self.base_url + self.gost_url)
+        html_content = await self.aget_html(self.base_url + self.gost_url)
         if not html_content:
             return gosts
         
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            soup = self.make_soup(html_content)
             
             # Parse news items containing GOSTs
             items = soup.find_all('div', class_='news')
@@ -419,10 +665,11 @@ class LibGostRuDataSource(GostDataSource):
                     desc_elem = item.find('p') or item.find('div', class_='desc')
                     description = desc_elem.get_text(strip=True) if desc_elem else ""
                     
-                    if 'ГОСТ' in name.upper() or name:
+                    if name and 'ГОСТ' in name.upper():
                         gosts.append({
                             'name': name,
-                            'description': description
+                            'description': description,
+                            'url': self.absolute_url(title_elem.get('href'))
                         })
             
             logger.info(f"Fetched {len(gosts)} GOSTs from {self.name}")
@@ -433,24 +680,96 @@ class LibGostRuDataSource(GostDataSource):
         return gosts
 
 
-# Registry of all available data sources
-DATA_SOURCES = [
-    GostRuDataSource(),
-    DocsCntdRuDataSource(),
-    MeganormRuDataSource(),
-    ProtectGostRuDataSource(),
-    FilesStroyinfRuDataSource(),
-    InternetLawRuDataSource(),
-    LibGostRuDataSource(),
+# Built-in data sources. Third-party sources are added through the
+# 'gostbot.data_sources' entry point group or the "plugins" config key.
+# Instances are only built on first use, so importing this module stays cheap.
+DATA_SOURCE_CLASSES = [
+    GostRuDataSource,
+    DocsCntdRuDataSource,
+    MeganormRuDataSource,
+    ProtectGostRuDataSource,
+    FilesStroyinfRuDataSource,
+    InternetLawRuDataSource,
+    LibGostRuDataSource,
 ]
 
+_sources_config: Optional[SourcesConfig] = None
+_data_sources: Optional[List[GostDataSource]] = None
 
-def get_all_data_sources() -> List[GostDataSource]:
-    """Get all available GOST data sources."""
-    return DATA_SOURCES
 
+def _load_plugin(target: str) -> Optional[Type[GostDataSource]]:
+    """Import a 'module:ClassName' plugin reference."""
+    module_name, _, class_name = target.partition(':')
+    try:
+        source_class = getattr(import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError) as e:
+        logger.error(f"Cannot load data source plugin {target}: {e}")
+        return None
+    if not (isinstance(source_class, type) and issubclass(source_class, GostDataSource)):
+        logger.error(f"Data source plugin {target} is not a GostDataSource subclass")
+        return None
+    return source_class
 
-def fetch_from_source(source: GostDataSource) -> List[Dict[str, str]]:
+
+def discover_source_classes(config: Optional[SourcesConfig] = None) -> List[Type[GostDataSource]]:
+    """
+    Collect built-in, entry point and configured plugin data source classes.
+    
+    Args:
+        config: Source configuration whose "plugins" are loaded as well.
+        
+    Returns:
+        List of unique data source classes.
+    """
+    classes = list(DATA_SOURCE_CLASSES)
+    targets = [entry_point.value for entry_point
+               in metadata.entry_points(group=ENTRY_POINT_GROUP)]
+    if config:
+        targets.extend(config.plugins)
+    
+    for target in targets:
+        source_class = _load_plugin(target)
+        if source_class and source_class not in classes:
+            classes.append(source_class)
+    return classes
+
+
+def configure_sources(config_path: Optional[str] = None):
+    """
+    (Re)load the source configuration and rebuild the registry on next use.
+    
+    Args:
+        config_path: JSON config file, defaults to $GOSTBOT_SOURCES_CONFIG.
+    """
+    global _sources_config, _data_sources
+    _sources_config = load_sources_config(config_path)
+    _data_sources = None
+
+
+def get_all_data_sources(include_disabled: bool = False) -> List[GostDataSource]:
+    """
+    Get the available GOST data sources, highest priority first.
+    
+    Args:
+        include_disabled: Also return sources switched off in the config.
+        
+    Returns:
+        List of configured data source instances.
+    """
+    global _data_sources
+    if _sources_config is None:
+        configure_sources()
+    if _data_sources is None:
+        sources = [source_class(_sources_config.for_source(source_class.name))
+                   for source_class in discover_source_classes(_sources_config)]
+        # Stable sort keeps the registration order among equal priorities
+        _data_sources = sorted(sources, key=lambda s: -s.config.priority)
+    if include_disabled:
+        return _data_sources
+    return [source for source in _data_sources if source.config.enabled]
+
+
+async def afetch_from_source(source: GostDataSource) -> List[Dict[str, str]]:
     """
     Fetch GOSTs from a specific data source.
     
@@ -458,75 +777,156 @@ def fetch_from_source(source: GostDataSource) -> List[Dict[str, str]]:
         source: The data source to fetch from.
         
     Returns:
-        List of GOST dictionaries.
+        List of GOST dictionaries, tagged with the source name.
     """
     logger.info(f"Fetching from {source.name}...")
-    return source.fetch_gosts()
+    with profiling.profile_source(source.name):
+        gosts = await source.afetch_gosts()
+    profiler = profiling.get_active()
+    if profiler:
+        profiler.count(source.name, records=len(gosts))
+    for gost in gosts:
+        gost.setdefault('source', source.name)
+    return gosts
 
 
-def fetch_from_all_sources() -> List[Dict[str, str]]:
+def fetch_from_source(source: GostDataSource) -> List[Dict[str, str]]:
+    """Synchronous afetch_from_source()."""
+    return run_sync(afetch_from_source(source))
+
+
+async def afetch_from_all_sources() -> List[Dict[str, str]]:
     """
-    Fetch GOSTs from all available data sources.
+    Fetch GOSTs from all enabled data sources concurrently.
+    
+    Results are combined in priority order, so when several sources return
+    the same GOST the higher priority source wins. While a profiler is
+    active the sources are fetched one after another instead, so that
+    their timings do not overlap.
     
     Returns:
         Combined list of GOSTs from all sources.
     """
-    all_gosts = []
+    sources = get_all_data_sources()
+    if profiling.get_active() is None:
+        results = await asyncio.gather(*(afetch_from_source(source) for source in sources),
+                                       return_exceptions=True)
+    else:
+        results = []
+        for source in sources:
+            try:
+                results.append(await afetch_from_source(source))
+            except Exception as e:
+                results.append(e)
     
-    for source in DATA_SOURCES:
-        try:
-            gosts = fetch_from_source(source)
+    all_gosts = []
+    for source, gosts in zip(sources, results):
+        if isinstance(gosts, Exception):
+            logger.error(f"Failed to fetch from {source.name}: {gosts}")
+        else:
             all_gosts.extend(gosts)
-        except Exception as e:
-            logger.error(f"Failed to fetch from {source.name}: {e}")
     
-    # Remove duplicates based on name
+    # Remove duplicates based on the normalized name, so "ГОСТ Р" spelled
+    # with a Latin "P" by one source is the same GOST as everyone else's
     seen_names = set()
     unique_gosts = []
     for gost in all_gosts:
-        if gost['name'] not in seen_names:
-            seen_names.add(gost['name'])
+        key = normalize_text(gost['name'])
+        if key not in seen_names:
+            seen_names.add(key)
             unique_gosts.append(gost)
     
     logger.info(f"Total unique GOSTs fetched: {len(unique_gosts)}")
     return unique_gosts
 
 
-def save_gosts_to_db(gosts: List[Dict[str, str]]) -> int:
+def fetch_from_all_sources() -> List[Dict[str, str]]:
+    """Synchronous afetch_from_all_sources()."""
+    return run_sync(afetch_from_all_sources())
+
+
+def save_gosts_to_db(gosts: List[Dict[str, str]], delete: bool = False) -> int:
     """
     Save GOSTs to the database.
     
+    New GOSTs are inserted and stored ones whose description or url changed
+    are updated; content changes are kept in the version history (see
+    history.py) and their cross-references re-extracted (references.py).
+    With pyarrow installed this goes through the columnar bulk path in
+    ingest.py, otherwise GOSTs are looked up one by one.
+    
     Args:
         gosts: List of GOST dictionaries with 'name' and 'description'.
+        delete: Delete stored GOSTs missing from ``gosts`` (needs pyarrow).
+            Only GOSTs of sources present in ``gosts`` are deleted, so a
+            source that failed keeps its catalog.
         
     Returns:
         Number of GOSTs saved.
     """
-    Base.metadata.create_all(engine)
+    from tgbot import history, ingest, references
+    
+    init_db()
+    
+    if ingest.HAS_ARROW:
+        diff = ingest.bulk_save_gosts(gosts, delete=delete)
+        logger.info(f"Saved {diff.inserts.num_rows} new GOSTs, updated "
+                    f"{diff.updates.num_rows}, {'deleted' if delete else 'kept'} "
+                    f"{diff.deletes.num_rows} no longer listed")
+        return diff.inserts.num_rows
+    if delete:
+        raise ImportError("pyarrow is required to delete GOSTs no longer listed")
     
+    history.record_missing()
     count = 0
+    seen = set()
+    changed = []
     for gost_data in gosts:
-        # Check if GOST already exists
-        existing = session.query(Gost).filter(Gost.name == gost_data['name']).first()
+        # Check if GOST already exists (normalized names are indexed)
+        name_norm = normalize_text(gost_data['name'])
+        if name_norm in seen:
+            continue
+        seen.add(name_norm)
+        existing = session.query(Gost).filter(Gost.name_norm == name_norm).first()
         if not existing:
-            gost = Gost(name=gost_data['name'], description=gost_data['description'])
-            session.add(gost)
+            existing = Gost(name=gost_data['name'],
+                            description=gost_data['description'],
+                            source=gost_data.get('source'),
+                            url=gost_data.get('url'))
+            session.add(existing)
             count += 1
-    
+        else:
+            if gost_data.get('url') and existing.url != gost_data['url']:
+                existing.url = gost_data['url']
+            if existing.description == gost_data['description']:
+                continue
+            existing.description = gost_data['description']
+        changed.append({'name_norm': name_norm, 'name': existing.name,
+                        'description': existing.description, 'url': existing.url})
+    
+    # Only GOSTs whose content hash changed get a new version
+    history.record_versions(changed)
+    references.record_references(changed)
+    if changed:
+        references.rebuild_closure()
     session.commit()
     logger.info(f"Saved {count} new GOSTs to database")
     return count
 
 
-def update_database_from_all_sources() -> int:
+def update_database_from_all_sources(delete: bool = False) -> int:
     """
     Fetch GOSTs from all sources and update the database.
     
+    Args:
+        delete: Delete stored GOSTs that their source no longer returns.
+            Sources that failed or returned nothing keep their GOSTs.
+    
     Returns:
         Number of new GOSTs added.
     """
     gosts = fetch_from_all_sources()
-    return save_gosts_to_db(gosts)
+    return save_gosts_to_db(gosts, delete=delete)
 
 
 if __name__ == '__main__':
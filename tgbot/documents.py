@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Full-text document retrieval and local document cache.
+
+Documents are fetched from the source a GOST came from, stored on disk
+gzip-compressed under their SHA-256 (so identical files are stored once)
+and evicted least-recently-used first when the cache outgrows its size
+budget. Once a document has been sent to Telegram its file_id is kept in
+the database, and later requests are served by file_id alone.
+"""
+
+import asyncio
+from datetime import datetime
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+from tgbot.data_sources import get_all_data_sources, run_sync
+from tgbot.fulltext import index_document
+from tgbot.models import Document, Gost, session
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_DIR = os.environ.get('GOSTBOT_DOCUMENTS_DIR', 'documents')
+DOCUMENTS_MAX_BYTES = int(os.environ.get('GOSTBOT_DOCUMENTS_MAX_BYTES', 512 * 1024 * 1024))
+
+
+class DocumentCache:
+    """
+    Content-addressed, compressed on-disk document store with LRU eviction.
+
+    The modification time of a file is its last use; reading a document
+    touches it, so eviction removes the documents unused the longest.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256 + '.gz')
+
+    def __contains__(self, sha256: str) -> bool:
+        return bool(sha256) and os.path.exists(self._path(sha256))
+
+    def put(self, content: bytes) -> str:
+        """
+        Store a document.
+
+        Args:
+            content: Raw document bytes.
+
+        Returns:
+            SHA-256 hex digest identifying the document.
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self._path(sha256)
+        if os.path.exists(path):
+            os.utime(path)
+            return sha256
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = gzip.compress(content, compresslevel=6)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(compressed)
+            self._evict(keep=path)
+        return sha256
+
+    def get(self, sha256: str) -> Optional[bytes]:
+        """
+        Read a document and mark it as recently used.
+
+        Args:
+            sha256: Digest returned by put().
+
+        Returns:
+            The document bytes, or None if it is not (or no longer) cached.
+        """
+        path = self._path(sha256)
+        try:
+            with open(path, 'rb') as f:
+                content = gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return content
+
+    def _entries(self):
+        """Yield (last use, size, path) of every cached document."""
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.gz'):
+                    path = os.path.join(directory, filename)
+                    stat = os.stat(path)
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self, keep: str):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for _, size, path in sorted(self._entries()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            self._total_bytes -= size
+            logger.info(f"Evicted {path} from the document cache")
+
+
+_document_cache: Optional[DocumentCache] = None
+
+
+def get_document_cache() -> DocumentCache:
+    """Get the process-wide document cache."""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache(DOCUMENTS_DIR, DOCUMENTS_MAX_BYTES)
+    return _document_cache
+
+
+async def _afetch_from_sources(gost: Gost) -> Optional[Tuple[bytes, str, str]]:
+    """Fetch a document from the GOST's own source, or any source if unknown."""
+    sources = get_all_data_sources(include_disabled=True)
+    if gost.source:
+        sources = [source for source in sources if source.name == gost.source]
+    else:
+        sources = [source for source in sources if source.config.enabled]
+
+    gost_data = {'name': gost.name, 'description': gost.description, 'url': gost.url}
+    for source in sources:
+        fetched = await source.afetch_document(gost_data)
+        if fetched:
+            return fetched
+    return None
+
+
+async def aget_document(gost_name: str, cache: Optional[DocumentCache] = None) -> Optional[Document]:
+    """
+    Get the document of a GOST, fetching and caching it if needed.
+
+    Nothing is fetched when the document was already uploaded to Telegram
+    or is still in the local cache. The download runs on the calling event
+    loop, through the sources' shared client session; compressing and
+    indexing the document run in a worker thread. The returned Document
+    is detached from the session.
+
+    Args:
+        gost_name: Exact GOST name as stored in the database.
+        cache: Document cache to use, defaults to the process-wide one.
+
+    Returns:
+        The Document record, or None if the document is not available.
+    """
+    cache = cache or get_document_cache()
+    document = session.query(Document).filter(Document.gost_name == gost_name).first()
+    if document and (document.file_id or document.sha256 in cache):
+        session.expunge(document)
+        return document
+
+    gost = session.query(Gost).filter(Gost.name == gost_name).first()
+    if gost is None:
+        return None
+    fetched = await _afetch_from_sources(gost)
+    if fetched is None:
+        return None
+
+    content, content_type, filename = fetched
+    # Compressing a large PDF would hold up the event loop
+    sha256 = await asyncio.to_thread(cache.put, content)
+    if document is None:
+        document = Document(gost_name=gost.name)
+        session.add(document)
+    document.sha256 = sha256
+    document.size = len(content)
+    document.content_type = content_type
+    document.filename = filename
+    document.fetched_at = datetime.utcnow()
+    session.commit()
+    session.refresh(document)
+    session.expunge(document)
+    
+    # Keep the full-text index up to date as documents arrive. Text
+    # extraction and OCR take seconds, so they run off the event loop
+    await asyncio.to_thread(_index_in_thread, document, content)
+    return document
+
+
+def _index_in_thread(document: Document, content: bytes):
+    """index_document() for a worker thread, on that thread's own session."""
+    try:
+        index_document(document, content)
+    except Exception as e:
+        logger.error(f"Failed to index document of {document.gost_name}: {e}")
+    finally:
+        session.remove()
+
+
+def get_document(gost_name: str, cache: Optional[DocumentCache] = None) -> Optional[Document]:
+    """Synchronous aget_document(), for code outside an event loop."""
+    return run_sync(aget_document(gost_name, cache))
+
+
+def read_document(document: Document, cache: Optional[DocumentCache] = None) -> Optional[bytes]:
+    """Read a document's content from the local cache."""
+    cache = cache or get_document_cache()
+    return cache.get(document.sha256)
+
+
+def remember_file_id(document: Document, file_id: str):
+    """
+    Store the Telegram file_id of an uploaded document.
+
+    Args:
+        document: The uploaded document.
+        file_id: file_id returned by Telegram for the upload.
+    """
+    session.query(Document).filter(Document.id == document.id).update(
+        {Document.file_id: file_id}
+    )
+    session.commit()
+    document.file_id = file_id
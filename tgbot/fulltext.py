@@ -0,0 +1,348 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Full-text search over downloaded GOST documents.
+
+Documents are split into passages of a few paragraphs, and every passage
+is added to an inverted index (term -> passages with term frequency) stored
+in the database. Queries are ranked with Okapi BM25, so a search for a
+requirement ("допуски на размеры резьбы") finds the passages, and with them
+the standards, that talk about it.
+
+Indexing is incremental: re-indexing a GOST replaces only its own passages.
+"""
+
+from collections import Counter
+import heapq
+import io
+import logging
+import math
+import os
+import re
+import tempfile
+from typing import List, Optional
+
+from sqlalchemy import func
+
+from tgbot import references
+from tgbot.lazy import is_available, lazy_import
+from tgbot.models import Document, Passage, Posting, chunks, session
+from tgbot.normalize import normalize_text
+
+logger = logging.getLogger(__name__)
+
+html = lazy_import('lxml.html')
+
+# Passage size in words, and the overlap used when a paragraph is split
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 20
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_WORD_RE = re.compile(r'\w+')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'в', 'во', 'для', 'до', 'же', 'за', 'и', 'из', 'или', 'к',
+    'как', 'на', 'не', 'о', 'об', 'от', 'по', 'при', 'с', 'со', 'то', 'у',
+    'что', 'это',
+))
+
+# Common Russian inflection endings, longest first
+_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ию', 'ью', 'ия', 'ья',
+    'ы', 'и', 'а', 'я', 'о', 'е', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+_MIN_STEM = 3
+
+
+class PassageHit:
+    """A full-text search result: a passage of a GOST with its BM25 score."""
+
+    __slots__ = ('gost_name', 'text', 'score')
+
+    def __init__(self, gost_name: str, text: str, score: float):
+        self.gost_name = gost_name
+        self.text = text
+        self.score = score
+
+    def __repr__(self):
+        return f"PassageHit({self.gost_name!r}, score={self.score:.3f})"
+
+
+def stem(word: str) -> str:
+    """Strip a Russian inflection ending, keeping at least a short stem."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Args:
+        text: Document text or a query.
+
+    Returns:
+        Normalized, stemmed terms without stop words.
+    """
+    words = _WORD_RE.findall(normalize_text(text))
+    return [stem(word) for word in words if word not in STOP_WORDS]
+
+
+def split_passages(text: str) -> List[str]:
+    """
+    Split a document into passages of about PASSAGE_WORDS words.
+
+    Short paragraphs are merged; paragraphs longer than a passage are cut
+    into overlapping windows, so no phrase is lost at a boundary.
+    """
+    passages = []
+    current: List[str] = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(current) + len(words) <= PASSAGE_WORDS:
+            current.extend(words)
+            continue
+        if current:
+            passages.append(' '.join(current))
+            current = []
+        step = PASSAGE_WORDS - PASSAGE_OVERLAP
+        while len(words) > PASSAGE_WORDS:
+            passages.append(' '.join(words[:PASSAGE_WORDS]))
+            words = words[step:]
+        current = words
+    if current:
+        passages.append(' '.join(current))
+    return passages
+
+
+def extract_text(content: bytes, content_type: str) -> Optional[str]:
+    """
+    Extract plain text from a downloaded document.
+
+    HTML and plain text are decoded directly, scanned images go through
+    Tesseract OCR, and PDFs are read with pdfminer.six. PDFs without a text
+    layer (scans) have their page images OCR'd instead.
+
+    Args:
+        content: Raw document bytes.
+        content_type: Media type, e.g. 'text/html' or 'application/pdf'.
+
+    Returns:
+        The document text, or None if it cannot be extracted.
+    """
+    if content_type == 'text/html':
+        return html.fromstring(content).text_content()
+    if content_type.startswith('text/'):
+        try:
+            return content.decode('utf-8')
+        except UnicodeDecodeError:
+            return content.decode('cp1251', errors='replace')
+    if content_type.startswith('image/'):
+        from tgbot.parse_tools import HAS_OCR, get_gost_from_photo
+        if HAS_OCR:
+            return get_gost_from_photo(io.BytesIO(content))
+    elif content_type == 'application/pdf' and is_available('pdfminer'):
+        from pdfminer.high_level import extract_text as extract_pdf_text
+        from tgbot.parse_tools import HAS_OCR
+        text = extract_pdf_text(io.BytesIO(content))
+        if text.strip() or not HAS_OCR:
+            return text
+        return _ocr_pdf(content)
+    logger.warning(f"Cannot extract text from {content_type} documents")
+    return None
+
+
+def _ocr_pdf(content: bytes) -> str:
+    """OCR the page images of a scanned PDF, page by page."""
+    from pdfminer.high_level import extract_pages
+    from pdfminer.image import ImageWriter
+    from tgbot.parse_tools import get_gost_from_photo
+
+    pages = []
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ImageWriter(tmp)
+        for page in extract_pages(io.BytesIO(content)):
+            texts = []
+            for image in _page_images(page):
+                try:
+                    texts.append(get_gost_from_photo(os.path.join(tmp, writer.export_image(image))))
+                except Exception as e:
+                    # JBIG2 and other formats PIL cannot open
+                    logger.warning(f"Cannot OCR an image of a PDF page: {e}")
+            pages.append('\n'.join(texts))
+    return '\n\n'.join(pages)
+
+
+def _page_images(item):
+    """Images of a PDF page, including those nested in figures."""
+    from pdfminer.layout import LTFigure, LTImage
+
+    for child in item:
+        if isinstance(child, LTImage):
+            yield child
+        elif isinstance(child, LTFigure):
+            yield from _page_images(child)
+
+
+def _delete_passages(gost_names: List[str]):
+    passage_ids = session.query(Passage.id).filter(Passage.gost_name.in_(gost_names))
+    session.query(Posting).filter(Posting.passage_id.in_(passage_ids)) \
+        .delete(synchronize_session=False)
+    session.query(Passage).filter(Passage.gost_name.in_(gost_names)) \
+        .delete(synchronize_session=False)
+
+
+def remove_documents(gost_names: List[str]):
+    """
+    Delete the document records and indexed passages of GOSTs removed from
+    the catalog. The cached files themselves are left to cache eviction.
+
+    Args:
+        gost_names: Catalog names of the removed GOSTs.
+    """
+    for chunk in chunks(gost_names):
+        _delete_passages(chunk)
+        session.query(Document).filter(Document.gost_name.in_(chunk)) \
+            .delete(synchronize_session=False)
+
+
+def index_text(gost_name: str, text: str) -> int:
+    """
+    (Re)index the full text of one GOST.
+
+    Args:
+        gost_name: GOST designation the text belongs to.
+        text: The document text.
+
+    Returns:
+        Number of passages indexed.
+    """
+    _delete_passages([gost_name])
+
+    postings = []
+    passages = split_passages(text)
+    for position, passage_text in enumerate(passages):
+        terms = Counter(tokenize(passage_text))
+        passage = Passage(gost_name=gost_name, position=position,
+                          text=passage_text, length=sum(terms.values()))
+        session.add(passage)
+        session.flush()
+        postings.extend({'term': term, 'passage_id': passage.id, 'tf': tf}
+                        for term, tf in terms.items())
+
+    if postings:
+        session.execute(Posting.__table__.insert(), postings)
+    session.commit()
+    logger.info(f"Indexed {len(passages)} passages of {gost_name}")
+    return len(passages)
+
+
+def index_document(document: Document, content: bytes) -> int:
+    """
+    Index a cached document unless this exact content is already indexed.
+
+    The standards the document refers to are added to the cross-reference
+    graph as well.
+
+    Args:
+        document: Document record (attached or detached).
+        content: The document bytes.
+
+    Returns:
+        Number of passages indexed (0 if nothing changed or no text).
+    """
+    if document.indexed_sha256 == document.sha256:
+        return 0
+    text = extract_text(content, document.content_type)
+    count = index_text(document.gost_name, text) if text else 0
+    # Documents name far more related standards than descriptions do; their
+    # body text says "вместо" too, so they only add 'references' edges
+    references.record_references([{'name_norm': normalize_text(document.gost_name),
+                                   'name': document.gost_name, 'description': text}],
+                                 origin=references.DOCUMENT)
+    session.query(Document).filter(Document.id == document.id).update(
+        {Document.indexed_sha256: document.sha256}
+    )
+    session.commit()
+    document.indexed_sha256 = document.sha256
+    return count
+
+
+def index_cached_documents(cache) -> int:
+    """
+    Index every cached document whose current content is not indexed yet.
+
+    Args:
+        cache: DocumentCache holding the document contents.
+
+    Returns:
+        Number of documents indexed.
+    """
+    pending = session.query(Document).filter(
+        (Document.indexed_sha256 == None) |  # noqa: E711
+        (Document.indexed_sha256 != Document.sha256)
+    ).all()
+
+    count = 0
+    for document in pending:
+        content = cache.get(document.sha256)
+        if content is not None:
+            index_document(document, content)
+            count += 1
+    return count
+
+
+def search_passages(query: str, limit: int = 5) -> List[PassageHit]:
+    """
+    Find the passages best matching a query, ranked by BM25.
+
+    Args:
+        query: Free-text query.
+        limit: Maximum number of passages to return.
+
+    Returns:
+        List of PassageHit, best first.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    passage_count, average_length = session.query(
+        func.count(Passage.id), func.avg(Passage.length)
+    ).one()
+    if not passage_count:
+        return []
+    average_length = average_length or 1
+
+    scores: Counter = Counter()
+    for term in terms:
+        postings = session.query(Posting.passage_id, Posting.tf, Passage.length) \
+            .join(Passage, Passage.id == Posting.passage_id) \
+            .filter(Posting.term == term).all()
+        if not postings:
+            continue
+        df = len(postings)
+        idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+        for passage_id, tf, length in postings:
+            norm = K1 * (1 - B + B * length / average_length)
+            scores[passage_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    if not best:
+        return []
+    passages = {
+        passage.id: passage for passage in
+        session.query(Passage).filter(Passage.id.in_([pid for pid, _ in best]))
+    }
+    return [PassageHit(passages[pid].gost_name, passages[pid].text, score)
+            for pid, score in best]
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Version history of GOST descriptions.
+
+Every refresh compares the content hash of each new or updated GOST with
+its current version in gost_versions; only when they differ is the current
+version closed (valid_to) and a new one opened (valid_from). That answers
+both "what did this standard say on a given date" and "what changed since
+a given date" from an index instead of a scan.
+"""
+
+from datetime import datetime
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import exists, func, or_
+from sqlalchemy.orm import aliased
+
+from tgbot.models import Gost, GostVersion, chunks, session
+from tgbot.normalize import normalize_text
+
+
+def content_hash(name: str, description: Optional[str]) -> str:
+    """SHA-256 of a GOST's name and description."""
+    return hashlib.sha256(f"{name}\0{description or ''}".encode('utf-8')).hexdigest()
+
+
+def record_missing() -> int:
+    """
+    Record the stored content of GOSTs that have no history yet.
+
+    These versions have no valid_from, as nobody knows since when they
+    were valid. After the first refresh this finds nothing.
+
+    Returns:
+        Number of versions recorded.
+    """
+    rows = session.query(Gost.name_norm, Gost.name, Gost.description, Gost.url).filter(
+        ~exists().where(GostVersion.name_norm == Gost.name_norm)
+    ).all()
+    seen = set()
+    versions = []
+    for name_norm, name, description, url in rows:
+        if name_norm in seen:
+            continue
+        seen.add(name_norm)
+        versions.append({
+            'name_norm': name_norm, 'name': name, 'description': description,
+            'url': url, 'content_sha256': content_hash(name, description),
+            'revision': 1, 'valid_from': None, 'valid_to': None,
+        })
+    session.bulk_insert_mappings(GostVersion, versions)
+    return len(versions)
+
+
+def record_versions(entries: Iterable[Dict[str, str]], now: Optional[datetime] = None) -> int:
+    """
+    Open a new version for every GOST whose content hash changed.
+
+    Args:
+        entries: Dictionaries with 'name_norm', 'name', 'description' and
+            'url' of new or updated GOSTs.
+        now: Start of the new versions, defaults to the current UTC time.
+
+    Returns:
+        Number of versions recorded.
+    """
+    now = now or datetime.utcnow()
+    count = 0
+    for chunk in chunks(list(entries)):
+        name_norms = [entry['name_norm'] for entry in chunk]
+        current = {
+            name_norm: (id, sha256)
+            for id, name_norm, sha256 in session.query(
+                GostVersion.id, GostVersion.name_norm, GostVersion.content_sha256,
+            ).filter(
+                GostVersion.name_norm.in_(name_norms),
+                GostVersion.valid_to.is_(None),
+            )
+        }
+        # Over closed versions too: a GOST removed and added again goes on
+        # from its last revision
+        last_revisions = dict(session.query(
+            GostVersion.name_norm, func.max(GostVersion.revision),
+        ).filter(GostVersion.name_norm.in_(name_norms)).group_by(GostVersion.name_norm))
+        closed, added = [], []
+        seen = set()
+        for entry in chunk:
+            name_norm = entry['name_norm']
+            if name_norm in seen:
+                continue
+            seen.add(name_norm)
+            sha256 = content_hash(entry['name'], entry['description'])
+            if name_norm in current:
+                id, current_sha256 = current[name_norm]
+                if sha256 == current_sha256:
+                    continue
+                closed.append({'id': id, 'valid_to': now})
+            revision = (last_revisions.get(name_norm) or 0) + 1
+            added.append({
+                'name_norm': name_norm, 'name': entry['name'],
+                'description': entry['description'], 'url': entry.get('url'),
+                'content_sha256': sha256, 'revision': revision,
+                'valid_from': now, 'valid_to': None,
+            })
+        session.bulk_update_mappings(GostVersion, closed)
+        session.bulk_insert_mappings(GostVersion, added)
+        count += len(added)
+    return count
+
+
+def close_versions(name_norms: Iterable[str], now: Optional[datetime] = None):
+    """
+    Close the current versions of GOSTs removed from the catalog.
+
+    Args:
+        name_norms: Normalized names of the removed GOSTs.
+        now: End of the versions, defaults to the current UTC time.
+    """
+    now = now or datetime.utcnow()
+    for chunk in chunks(list(name_norms)):
+        session.query(GostVersion).filter(
+            GostVersion.name_norm.in_(chunk),
+            GostVersion.valid_to.is_(None),
+        ).update({GostVersion.valid_to: now}, synchronize_session=False)
+
+
+def version_at(name: str, when: datetime) -> Optional[GostVersion]:
+    """
+    Get the version of a GOST that was valid at a point in time.
+
+    Args:
+        name: GOST name, in any spelling normalize_text() folds.
+        when: Point in time (UTC).
+
+    Returns:
+        The GostVersion, or None if the GOST was not known then.
+    """
+    return session.query(GostVersion).filter(
+        GostVersion.name_norm == normalize_text(name),
+        or_(GostVersion.valid_from.is_(None), GostVersion.valid_from <= when),
+        or_(GostVersion.valid_to.is_(None), GostVersion.valid_to > when),
+    ).order_by(GostVersion.valid_from.desc()).first()
+
+
+def history_of(name: str) -> List[GostVersion]:
+    """Get all versions of a GOST, oldest first."""
+    return session.query(GostVersion).filter(
+        GostVersion.name_norm == normalize_text(name)
+    ).order_by(GostVersion.revision, GostVersion.id).all()
+
+
+def changed_since(since: datetime, include_new: bool = False,
+                  limit: Optional[int] = None) -> List[GostVersion]:
+    """
+    Get the versions opened since a point in time.
+
+    Args:
+        since: Point in time (UTC).
+        include_new: Also return first versions of newly added GOSTs.
+        limit: Maximum number of versions, or None for all.
+
+    Returns:
+        GostVersion records, oldest first.
+    """
+    query = session.query(GostVersion).filter(GostVersion.valid_from >= since)
+    if not include_new:
+        query = query.filter(GostVersion.revision > 1)
+    query = query.order_by(GostVersion.valid_from, GostVersion.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def removed_since(since: datetime) -> List[GostVersion]:
+    """
+    Get the last versions of GOSTs removed from the catalog since a point in time.
+
+    Args:
+        since: Point in time (UTC).
+
+    Returns:
+        Closed GostVersion records that have no current successor.
+    """
+    current = aliased(GostVersion)
+    return session.query(GostVersion).filter(
+        GostVersion.valid_to >= since,
+        ~exists().where(current.name_norm == GostVersion.name_norm).where(
+            current.valid_to.is_(None)),
+    ).order_by(GostVersion.valid_to, GostVersion.id).all()
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Columnar bulk ingest of source records.
+
+Fetched records are collected into an Arrow table and compared with a
+columnar snapshot of the current database as set differences on the
+normalized designation (Arrow's hash kernels do the lookups), instead of
+querying the database once per record. The result is a CatalogDiff of rows
+to insert, update and delete, applied with bulk statements.
+
+pyarrow is optional (requirements-arrow.txt): without it save_gosts_to_db
+falls back to the row-by-row path. Tables can be stored as Parquet files, e.g. to keep the
+catalog as it was after every refresh.
+"""
+
+from datetime import datetime
+import os
+from typing import Dict, Iterable, List, Optional
+
+from tgbot import fulltext, history, references
+from tgbot.lazy import is_available
+from tgbot.models import Gost, chunks, session
+from tgbot.normalize import HOMOGLYPHS, LATIN_HOMOGLYPHS, normalize_text
+
+HAS_ARROW = is_available('pyarrow')
+
+# Strings made of ASCII and basic Cyrillic only. For them lower() equals
+# casefold() and the RE2 classes below match exactly what the re classes
+# in normalize.py match, so they are normalized with Arrow kernels; the
+# (rare) rest goes through normalize_text().
+_VECTORIZABLE_RE = r'^[\x00-\x7fЀ-џ]*$'
+# Latin letters without a Cyrillic look-alike. Strings with one of them and
+# any look-alike need the per-word homoglyph rule of normalize_text() as well.
+_OTHER_LATIN_RE = '[' + ''.join(sorted(
+    set('abcdefghijklmnopqrstuvwxyz') - set(map(chr, HOMOGLYPHS)))) + ']'
+_ANY_HOMOGLYPH_RE = '[' + ''.join(map(chr, HOMOGLYPHS)) + ''.join(map(chr, LATIN_HOMOGLYPHS)) + ']'
+_SPACE = r'[\t\n\x0b\x0c\r \x1c-\x1f]'
+_PUNCTUATION_RE = r'[^\pL\pN\t\n\x0b\x0c\r \x1c-\x1f./-]|_'
+_HOMOGLYPH_RE = '[' + ''.join(map(chr, HOMOGLYPHS)) + ']'
+
+# Columns of an incoming records table
+COLUMNS = ('name', 'description', 'source', 'url', 'name_norm', 'description_norm')
+
+
+def records_to_table(gosts: Iterable[Dict[str, str]]):
+    """
+    Collect source records into an Arrow table.
+
+    Args:
+        gosts: GOST dictionaries with 'name', 'description' and optionally
+            'source' and 'url'.
+
+    Returns:
+        pyarrow.Table with the COLUMNS columns; records without a name are skipped.
+    """
+    import pyarrow as pa
+
+    fields = ('name', 'description', 'source', 'url')
+    columns: Dict[str, List[Optional[str]]] = {field: [] for field in fields}
+    for gost in gosts:
+        if not gost.get('name'):
+            continue
+        for field in fields:
+            columns[field].append(gost.get(field))
+    columns['description'] = [description or '' for description in columns['description']]
+    arrays = {field: pa.array(columns[field], pa.string()) for field in fields}
+    arrays['name_norm'] = normalize_array(arrays['name'])
+    arrays['description_norm'] = normalize_array(arrays['description'])
+    return pa.table(arrays)
+
+
+def normalize_array(array):
+    """
+    Vectorized normalize_text() over an Arrow string array.
+
+    Args:
+        array: pyarrow string array.
+
+    Returns:
+        String array with every value equal to normalize_text() of the input.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    array = pc.fill_null(array, '')
+    result = pc.utf8_lower(array)
+    # Dash variants are not basic Cyrillic, so such rows fall back
+    result = pc.replace_substring(result, 'ё', 'е')
+    # Without other Latin letters every Latin look-alike is in a word folded
+    # into Cyrillic: one pass per homoglyph, over the rows that have any
+    has_other_latin = pc.match_substring_regex(result, _OTHER_LATIN_RE)
+    folded = pc.and_(pc.match_substring_regex(result, _HOMOGLYPH_RE),
+                     pc.invert(has_other_latin))
+    subset = result.filter(folded)
+    for char, replacement in HOMOGLYPHS.items():
+        subset = pc.replace_substring(subset, chr(char), replacement)
+    result = pc.replace_with_mask(result, folded, subset)
+    result = pc.replace_substring_regex(result, _PUNCTUATION_RE, ' ')
+    result = pc.replace_substring_regex(result, _SPACE + '*-' + _SPACE + '*', '-')
+    result = pc.replace_substring_regex(result, r'(\pL)(\pN)', r'\1 \2')
+    result = pc.replace_substring_regex(result, _SPACE + '+', ' ')
+    result = pc.utf8_trim(result, ' ')
+
+    mixed = pc.and_(has_other_latin, pc.match_substring_regex(result, _ANY_HOMOGLYPH_RE))
+    vectorizable = pc.and_(pc.match_substring_regex(array, _VECTORIZABLE_RE), pc.invert(mixed))
+    if pc.all(vectorizable).as_py():
+        return result
+    fallback = pa.array([None if ok else normalize_text(value)
+                         for value, ok in zip(array.to_pylist(), vectorizable.to_pylist())],
+                        pa.string())
+    return pc.if_else(vectorizable, result, fallback)
+
+
+def deduplicate(table):
+    """
+    Keep the first record of every normalized designation.
+
+    Records come in source priority order, so the highest priority source wins.
+
+    Args:
+        table: Table built by records_to_table().
+
+    Returns:
+        Table without duplicate name_norm values, in the original order.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if table.num_rows == 0:
+        return table
+    numbered = table.append_column('_row', pa.array(range(table.num_rows), pa.int64()))
+    first = numbered.group_by('name_norm').aggregate([('_row', 'min')])['_row_min']
+    return table.take(pc.take(first, pc.sort_indices(first)))
+
+
+def current_table(batch_size: int = 10000):
+    """
+    Read a columnar snapshot of the catalog stored in the database.
+
+    Args:
+        batch_size: Number of rows fetched per database round trip.
+
+    Returns:
+        pyarrow.Table with id, name, name_norm, description, source and url columns.
+    """
+    import pyarrow as pa
+
+    columns = (Gost.id, Gost.name, Gost.name_norm, Gost.description, Gost.source, Gost.url)
+    values: List[list] = [[] for _ in columns]
+    for row in session.query(*columns).yield_per(batch_size):
+        for column_values, value in zip(values, row):
+            column_values.append(value)
+    types = [pa.int64()] + [pa.string()] * (len(columns) - 1)
+    return pa.table({column.key: pa.array(column_values, type)
+                     for column, column_values, type in zip(columns, values, types)})
+
+
+class CatalogDiff:
+    """
+    Changes needed to bring the database in line with the incoming records.
+
+    Attributes:
+        inserts: Incoming records whose designation is not in the database.
+        updates: Rows (id, name, name_norm, description, description_norm,
+            url) whose description or url changed.
+        deletes: Database rows (id, name, name_norm) their source no longer
+            returns. Rows of sources missing from the incoming records are
+            never listed.
+    """
+
+    def __init__(self, inserts, updates, deletes):
+        self.inserts = inserts
+        self.updates = updates
+        self.deletes = deletes
+
+    def __repr__(self):
+        return (f"CatalogDiff(inserts={self.inserts.num_rows}, "
+                f"updates={self.updates.num_rows}, deletes={self.deletes.num_rows})")
+
+
+def diff_tables(incoming, current) -> CatalogDiff:
+    """
+    Compare incoming records with the current catalog.
+
+    Args:
+        incoming: Deduplicated table from records_to_table().
+        current: Table from current_table().
+
+    Returns:
+        CatalogDiff of the two tables.
+    """
+    import pyarrow.compute as pc
+
+    known = pc.is_in(incoming['name_norm'], value_set=current['name_norm'].combine_chunks())
+    still_listed = pc.is_in(current['name_norm'], value_set=incoming['name_norm'].combine_chunks())
+    inserts = incoming.filter(pc.invert(known))
+    # Only rows of the sources that returned records are deleted: a source
+    # that failed or answered with nothing keeps its catalog
+    fetched = pc.is_in(current['source'], value_set=pc.unique(incoming['source'].combine_chunks()))
+    deletes = current.filter(pc.and_(pc.invert(still_listed), fetched)).select(
+        ['id', 'name', 'name_norm'])
+
+    old = current.select(['id', 'name', 'name_norm', 'description', 'url']).rename_columns(
+        ['id', 'name', 'name_norm', 'old_description', 'old_url'])
+    joined = incoming.filter(known).select(
+        ['name_norm', 'description', 'description_norm', 'url']).join(old, 'name_norm')
+    # A source that does not report a url keeps the stored one
+    url = pc.coalesce(joined['url'], joined['old_url'])
+    changed = pc.or_(
+        pc.not_equal(joined['description'], pc.fill_null(joined['old_description'], '')),
+        pc.not_equal(pc.fill_null(url, ''), pc.fill_null(joined['old_url'], '')),
+    )
+    joined = joined.set_column(joined.schema.get_field_index('url'), 'url', url)
+    updates = joined.filter(changed).select(
+        ['id', 'name', 'name_norm', 'description', 'description_norm', 'url'])
+    return CatalogDiff(inserts, updates, deletes)
+
+
+def apply_diff(diff: CatalogDiff, delete: bool = False):
+    """
+    Write a CatalogDiff to the database with bulk statements.
+
+    New versions are recorded in the history for inserted and updated rows
+    whose content changed, and deleted rows get their version closed. The
+    cross-references of inserted, updated and deleted rows are re-extracted.
+    Deleted rows also lose their documents and indexed passages; their
+    subscriptions are kept, so subscribers are told about the removal.
+
+    Args:
+        diff: Changes computed by diff_tables().
+        delete: Also delete the rows listed in diff.deletes. Off by default.
+    """
+    now = datetime.utcnow()
+    history.record_missing()
+    inserts = diff.inserts.to_pylist()
+    updates = diff.updates.to_pylist()
+    session.bulk_insert_mappings(Gost, inserts)
+    session.bulk_update_mappings(Gost, updates)
+    history.record_versions(inserts + updates, now)
+    references.record_references(inserts + updates)
+    if delete:
+        for chunk in chunks(diff.deletes['id'].to_pylist()):
+            session.query(Gost).filter(Gost.id.in_(chunk)).delete(synchronize_session=False)
+        history.close_versions(diff.deletes['name_norm'].to_pylist(), now)
+        references.remove_references(diff.deletes['name_norm'].to_pylist())
+        fulltext.remove_documents(diff.deletes['name'].to_pylist())
+    if inserts or updates or (delete and diff.deletes.num_rows):
+        references.rebuild_closure()
+    session.commit()
+
+
+def bulk_save_gosts(gosts: Iterable[Dict[str, str]], delete: bool = False) -> CatalogDiff:
+    """
+    Save fetched GOSTs to the database through the columnar path.
+
+    Args:
+        gosts: GOST dictionaries, in source priority order.
+        delete: Delete GOSTs that are not in ``gosts`` any more, among
+            those of the sources present in ``gosts``.
+
+    Returns:
+        The applied CatalogDiff.
+    """
+    incoming = deduplicate(records_to_table(gosts))
+    diff = diff_tables(incoming, current_table())
+    apply_diff(diff, delete=delete)
+    return diff
+
+
+def write_parquet(table, path: str):
+    """
+    Write a table to a Parquet file, replacing it atomically.
+
+    Args:
+        table: pyarrow.Table, e.g. from current_table().
+        path: Destination file path.
+    """
+    import pyarrow.parquet as pq
+
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def read_parquet(path: str):
+    """Read a table written by write_parquet()."""
+    import pyarrow.parquet as pq
+    return pq.read_table(path)
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Deferred imports for heavy optional dependencies.
+
+Scraping (aiohttp, BeautifulSoup, lxml) and OCR (PIL, pytesseract) are only
+needed when data is fetched, not when the bot answers searches, so they are
+imported on first attribute access instead of at module import time.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return a module that is only executed when one of its attributes is used.
+
+    Args:
+        name: Fully qualified module name, e.g. 'lxml.html'.
+
+    Returns:
+        The module object (already loaded if it was imported before).
+
+    Raises:
+        ImportError: If the module cannot be found.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_available(*names: str) -> bool:
+    """Check whether all given modules can be imported, without importing them."""
+    try:
+        return all(importlib.util.find_spec(name) is not None for name in names)
+    except (ImportError, ValueError):
+        return False
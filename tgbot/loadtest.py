@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Load-testing harness that replays synthetic Telegram traffic.
+
+Synthetic Update objects are fed straight into the bot's Dispatcher, and
+every Bot API call is answered by an in-process session that records it
+instead of talking to Telegram. N simulated users run the
+/start -> "Поиск" -> query conversation concurrently, with queries drawn
+from a Zipf distribution (a few popular standards, a long tail of rare
+ones), and the harness reports throughput and handler latency percentiles.
+
+Usage:
+    python -m tgbot.loadtest [--users N] [--flows N] [--seed N]
+"""
+
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import itertools
+import math
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Document, Message, Update, User
+
+# Queries used when the database has no GOSTs to sample from
+DEFAULT_QUERIES = [
+    '2.105', '2.104', '21.101', 'ГОСТ Р 52857', 'резьба', 'сварные швы',
+    '9.032', '15150', 'ГОСТ 8732', 'трубы', '2.106', '14254', 'болты',
+]
+
+STEPS = ('start', 'search', 'query')
+
+
+class RecordingSession(BaseSession):
+    """Bot API session that answers every call locally and records it."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = getattr(method, '__returning__', None)
+        if returning is bool:
+            return True
+        if returning is Message:
+            chat_id = getattr(method, 'chat_id', 0)
+            document = None
+            if type(method).__name__ == 'SendDocument':
+                document = Document(file_id='loadtest', file_unique_id='loadtest')
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=chat_id, type='private'),
+                text=getattr(method, 'text', None),
+                document=document,
+            )
+        return None
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+
+def zipf_queries(queries: Sequence[str], count: int, rng: random.Random,
+                 exponent: float = 1.1) -> List[str]:
+    """
+    Draw queries so that the k-th most popular one is ~1/k^exponent as likely.
+
+    Args:
+        queries: Candidate queries, most popular first.
+        count: Number of queries to draw.
+        rng: Random generator.
+        exponent: Zipf exponent.
+
+    Returns:
+        List of drawn queries.
+    """
+    weights = [1 / (rank ** exponent) for rank in range(1, len(queries) + 1)]
+    return rng.choices(queries, weights=weights, k=count)
+
+
+def sample_queries(limit: int = 500) -> List[str]:
+    """Build realistic queries (full names and bare numbers) from the database."""
+    from tgbot.models import Gost, session
+    from tgbot.normalize import designation_number, normalize_text
+
+    try:
+        names = [name for name, in session.query(Gost.name).limit(limit)]
+    except Exception:
+        names = []
+    if not names:
+        return list(DEFAULT_QUERIES)
+    queries = []
+    for name in names:
+        queries.append(name)
+        number = designation_number(normalize_text(name))
+        if number:
+            queries.append(number)
+    return queries
+
+
+class LoadTest:
+    """
+    Replays the start -> Поиск -> query flow for many concurrent users.
+
+    Args:
+        dp: Dispatcher under test (see bot.create_dispatcher).
+        queries: Query population, most popular first.
+        users: Number of concurrent simulated users.
+        flows: Conversations each user goes through.
+        seed: Random seed, for reproducible runs.
+        api_latency: Simulated Bot API round trip, in seconds.
+    """
+
+    def __init__(self, dp: Dispatcher, queries: Sequence[str], users: int = 50,
+                 flows: int = 5, seed: int = 0, api_latency: float = 0.0):
+        self.dp = dp
+        self.session = RecordingSession(latency=api_latency)
+        self.bot = Bot(token='42:LOADTEST', session=self.session)
+        self.users = users
+        self.flows = flows
+        self.queries = zipf_queries(queries, users * flows, random.Random(seed))
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def make_update(self, user_id: int, text: str) -> Update:
+        """Build a private-chat text message update from a user."""
+        user = User(id=user_id, is_bot=False, first_name=f'user{user_id}')
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=user_id, type='private'),
+                from_user=user,
+                text=text,
+            ),
+        )
+
+    async def _send(self, step: str, user_id: int, text: str):
+        update = self.make_update(user_id, text)
+        start = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies[step].append(time.perf_counter() - start)
+
+    async def _user(self, user_id: int):
+        for flow in range(self.flows):
+            query = self.queries[(user_id - 1) * self.flows + flow]
+            await self._send('start', user_id, '/start')
+            await self._send('search', user_id, 'Поиск')
+            await self._send('query', user_id, query)
+
+    async def run(self) -> 'LoadTestReport':
+        """Run all simulated users concurrently and collect the results."""
+        start = time.perf_counter()
+        await asyncio.gather(*(self._user(user_id)
+                               for user_id in range(1, self.users + 1)))
+        elapsed = time.perf_counter() - start
+        return LoadTestReport(elapsed, self.latencies, self.session.calls)
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sequence (fraction in 0..1)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+class LoadTestReport:
+    """Throughput and latency percentiles of a load test run."""
+
+    def __init__(self, elapsed: float, latencies: Dict[str, List[float]], calls: Counter):
+        self.elapsed = elapsed
+        self.latencies = latencies
+        self.calls = calls
+
+    @property
+    def updates(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        """Handled updates per second."""
+        return self.updates / self.elapsed if self.elapsed else 0.0
+
+    def summary(self, step: Optional[str] = None) -> Dict[str, float]:
+        """p50/p95/p99/max handler latency in milliseconds, for one step or all."""
+        if step:
+            values = self.latencies.get(step, [])
+        else:
+            values = [value for values in self.latencies.values() for value in values]
+        return {
+            'p50': percentile(values, 0.50) * 1000,
+            'p95': percentile(values, 0.95) * 1000,
+            'p99': percentile(values, 0.99) * 1000,
+            'max': max(values, default=0.0) * 1000,
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"Updates handled: {self.updates} in {self.elapsed:.2f} s "
+            f"({self.throughput:.1f} updates/s)",
+            "Bot API calls: " + ', '.join(f"{name}={count}"
+                                           for name, count in self.calls.most_common()),
+            '',
+            f"  {'step':<8}{'count':>8}{'p50, ms':>10}{'p95, ms':>10}{'p99, ms':>10}{'max, ms':>10}",
+        ]
+        for step in STEPS + (None,):
+            summary = self.summary(step)
+            count = len(self.latencies.get(step, [])) if step else self.updates
+            lines.append(f"  {step or 'all':<8}{count:>8}" +
+                         ''.join(f"{summary[key]:>10.2f}" for key in ('p50', 'p95', 'p99', 'max')))
+        return '\n'.join(lines)
+
+
+async def run_load_test(users: int, flows: int, seed: int = 0,
+                        api_latency: float = 0.0) -> LoadTestReport:
+    """Run the load test against the bot's real handlers and database."""
+    from tgbot.bot import create_dispatcher
+
+    load_test = LoadTest(create_dispatcher(), sample_queries(), users=users,
+                         flows=flows, seed=seed, api_latency=api_latency)
+    return await load_test.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay synthetic traffic through the bot.')
+    parser.add_argument('--users', type=int, default=50, help='Concurrent simulated users')
+    parser.add_argument('--flows', type=int, default=5, help='Search conversations per user')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help='Simulated Bot API round trip in seconds')
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args.users, args.flows, args.seed, args.api_latency))
+    print(report.format())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,40 @@
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String
+import os
+from typing import List
+
+from sqlalchemy import DDL, Column, Integer, String, DateTime, ForeignKey, Index, bindparam, event, inspect, text
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, validates
+
+from tgbot.normalize import NORMALIZER_VERSION, normalize_text
+
+
+DATABASE_URL = os.environ.get('GOSTBOT_DATABASE_URL', 'sqlite:///gosts.db')
+
+_engine = None
+
+
+def get_engine():
+    """Create the database engine on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL)
+    return _engine
 
 
-engine = create_engine('sqlite:///gosts.db')
-Session = sessionmaker(bind=engine)
-session = Session()
+# Values per IN (...) query; SQLite allows at most 999 bound parameters
+BATCH_SIZE = 500
+
+
+def chunks(items: List, size: int = BATCH_SIZE):
+    """Split a list into slices small enough for one IN (...) query."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+Session = sessionmaker()
+# The session is only opened (and the engine created) when first used
+session = scoped_session(lambda: Session(bind=get_engine()))
 Base = declarative_base()
 #по идеи это все надо вынестии в __init__ файл
 
@@ -16,6 +43,272 @@ class Gost(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     description = Column(String)
+    # Data source the GOST was fetched from, and its page there
+    source = Column(String)
+    url = Column(String)
+    # Normalized shadow copies of name and description (see normalize.py),
+    # filled at ingest so searches never normalize rows at query time.
+    # Substring search runs on the GOSTS_FTS index; the name_norm index
+    # serves exact designation lookups.
+    name_norm = Column(String, index=True)
+    description_norm = Column(String)
+
+    @validates('name', 'description')
+    def _normalize(self, key, value):
+        setattr(self, key + '_norm', normalize_text(value))
+        return value
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+# Trigram full-text index (SQLite FTS5) over the normalized columns. A B-tree
+# index cannot serve LIKE '%query%'; the trigram index answers substring
+# matches of 3+ characters. Triggers keep it in sync with the gosts table.
+GOSTS_FTS = 'gosts_fts'
+_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE {GOSTS_FTS} USING fts5(name_norm, description_norm, "
+    "content='gosts', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER {GOSTS_FTS}_insert AFTER INSERT ON gosts BEGIN "
+    f"INSERT INTO {GOSTS_FTS}(rowid, name_norm, description_norm) "
+    "VALUES (new.id, new.name_norm, new.description_norm); END",
+    f"CREATE TRIGGER {GOSTS_FTS}_delete AFTER DELETE ON gosts BEGIN "
+    f"INSERT INTO {GOSTS_FTS}({GOSTS_FTS}, rowid, name_norm, description_norm) "
+    "VALUES ('delete', old.id, old.name_norm, old.description_norm); END",
+    f"CREATE TRIGGER {GOSTS_FTS}_update AFTER UPDATE OF name_norm, description_norm ON gosts BEGIN "
+    f"INSERT INTO {GOSTS_FTS}({GOSTS_FTS}, rowid, name_norm, description_norm) "
+    "VALUES ('delete', old.id, old.name_norm, old.description_norm); "
+    f"INSERT INTO {GOSTS_FTS}(rowid, name_norm, description_norm) "
+    "VALUES (new.id, new.name_norm, new.description_norm); END",
+)
+for _statement in _FTS_DDL:
+    event.listen(Gost.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+class GostVersion(Base):
+    """
+    One version of a GOST's content, valid from valid_from until valid_to.
+
+    The current version has no valid_to. Versions recorded before history
+    was kept have no valid_from (valid since the beginning).
+    """
+    __tablename__ = 'gost_versions'
+    __table_args__ = (
+        # Point-in-time lookups of one GOST
+        Index('ix_gost_versions_name_period', 'name_norm', 'valid_from', 'valid_to'),
+    )
+    id = Column(Integer, primary_key=True)
+    name_norm = Column(String)
+    name = Column(String)
+    description = Column(String)
+    url = Column(String)
+    # SHA-256 of name and description, compared on every refresh
+    content_sha256 = Column(String)
+    # 1 for the first known version of a GOST
+    revision = Column(Integer)
+    valid_from = Column(DateTime, index=True)
+    valid_to = Column(DateTime, index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Subscription(Base):
+    """A chat following changes of one GOST."""
+    __tablename__ = 'subscriptions'
+    __table_args__ = (
+        # Designation -> subscribers, used by the notification job
+        Index('ix_subscriptions_name_chat', 'name_norm', 'chat_id', unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, index=True)
+    name_norm = Column(String)
+    # GOST name as shown to the user
+    name = Column(String)
+    created_at = Column(DateTime)
+
+    def __str__(self):
+        return self.name
+
+
+class GostReference(Base):
+    """
+    Edge of the cross-reference graph: source_norm replaces, or refers to,
+    the standard target_norm.
+
+    Edges are extracted from the text of the source GOST (see references.py);
+    origin tells whether that text was its description or its document.
+    """
+    __tablename__ = 'gost_references'
+    __table_args__ = (
+        # What a GOST replaces / refers to
+        Index('ix_gost_references_source', 'source_norm', 'kind', 'target_norm'),
+        # What replaced / refers to a GOST
+        Index('ix_gost_references_target', 'target_norm', 'kind', 'source_norm'),
+    )
+    id = Column(Integer, primary_key=True)
+    source_norm = Column(String)
+    source_name = Column(String)
+    target_norm = Column(String)
+    # Designation of the target as written, which may not be in the catalog
+    target_name = Column(String)
+    # 'replaces' or 'references'
+    kind = Column(String)
+    # 'description' or 'document'
+    origin = Column(String)
+
+    def __str__(self):
+        return f'{self.source_name} {self.kind} {self.target_name}'
+
+
+class GostSupersession(Base):
+    """
+    Transitive closure of the 'replaces' edges: newer_norm (directly or
+    through a chain of editions) replaces older_norm, depth steps back.
+
+    It is a cache rebuilt from gost_references whenever edges change.
+    """
+    __tablename__ = 'gost_supersessions'
+    __table_args__ = (
+        Index('ix_gost_supersessions_newer', 'newer_norm', 'depth'),
+        Index('ix_gost_supersessions_older', 'older_norm', 'depth'),
+    )
+    id = Column(Integer, primary_key=True)
+    newer_norm = Column(String)
+    newer_name = Column(String)
+    older_norm = Column(String)
+    older_name = Column(String)
+    depth = Column(Integer)
+
+
+class Document(Base):
+    """Full text (or PDF) of a GOST, stored in the local document cache."""
+    __tablename__ = 'documents'
+    id = Column(Integer, primary_key=True)
+    gost_name = Column(String, index=True, unique=True)
+    sha256 = Column(String, index=True)
+    size = Column(Integer)
+    content_type = Column(String)
+    filename = Column(String)
+    # Telegram file_id once the document has been uploaded
+    file_id = Column(String)
+    fetched_at = Column(DateTime)
+    # Content hash last added to the full-text index
+    indexed_sha256 = Column(String)
+
+    def __str__(self):
+        return self.filename
+
+
+class Passage(Base):
+    """A chunk of a GOST's full text, the unit of full-text search."""
+    __tablename__ = 'passages'
+    id = Column(Integer, primary_key=True)
+    gost_name = Column(String, index=True)
+    position = Column(Integer)
+    text = Column(String)
+    # Number of indexed terms, used for BM25 length normalization
+    length = Column(Integer)
+
+    def __str__(self):
+        return self.text
+
+
+class Posting(Base):
+    """Inverted index entry: a term occurring tf times in a passage."""
+    __tablename__ = 'postings'
+    term = Column(String, primary_key=True)
+    passage_id = Column(Integer, ForeignKey('passages.id'), primary_key=True, index=True)
+    tf = Column(Integer)
+
+
+def init_db(engine=None):
+    """
+    Create missing tables, columns and indexes introduced since a table was created.
+
+    SQLite cannot alter columns in place, so only new nullable columns are
+    added; existing data is left untouched.
+    """
+    engine = engine or get_engine()
+    Base.metadata.create_all(engine)
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+        # Substring search moved to the trigram index
+        connection.execute(text('DROP INDEX IF EXISTS ix_gosts_description_norm'))
+        _renormalize(connection)
+        _backfill_normalized(connection)
+        _create_fulltext_index(connection)
+
+
+def _renormalize(connection):
+    """
+    Recompute the normalized columns written by an older normalize_text().
+
+    The normalizer version is kept in SQLite's user_version; other databases
+    are left as they are.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    if connection.execute(text('PRAGMA user_version')).scalar() >= NORMALIZER_VERSION:
+        return
+    # _backfill_normalized() fills them again
+    connection.execute(Gost.__table__.update().values(name_norm=None))
+    for table, columns in (
+        (GostVersion.__table__, {'name_norm': 'name'}),
+        (Subscription.__table__, {'name_norm': 'name'}),
+        (GostReference.__table__, {'source_norm': 'source_name', 'target_norm': 'target_name'}),
+        (GostSupersession.__table__, {'newer_norm': 'newer_name', 'older_norm': 'older_name'}),
+    ):
+        rows = connection.execute(table.select().with_only_columns(
+            [table.c.id] + [table.c[name] for name in columns.values()])).fetchall()
+        if rows:
+            update = table.update().where(table.c.id == bindparam('row_id')).values(
+                {norm: bindparam('new_' + norm) for norm in columns})
+            connection.execute(update, [
+                dict({'row_id': row[0]}, **{'new_' + norm: normalize_text(value)
+                                            for norm, value in zip(columns, row[1:])})
+                for row in rows
+            ])
+    connection.execute(text(f'PRAGMA user_version = {NORMALIZER_VERSION}'))
+
+
+def _create_fulltext_index(connection):
+    """Create and fill the trigram index of catalogs stored before it existed."""
+    if connection.dialect.name != 'sqlite' or connection.dialect.has_table(connection, GOSTS_FTS):
+        return
+    for statement in _FTS_DDL:
+        connection.execute(text(statement))
+    connection.execute(text(f"INSERT INTO {GOSTS_FTS}({GOSTS_FTS}) VALUES ('rebuild')"))
+
+
+def _backfill_normalized(connection, batch_size: int = 1000):
+    """Fill the normalized shadow columns of rows stored before they existed."""
+    gosts = Gost.__table__
+    select = gosts.select().with_only_columns(
+        [gosts.c.id, gosts.c.name, gosts.c.description]
+    ).where(gosts.c.name_norm.is_(None)).limit(batch_size)
+    update = gosts.update().where(gosts.c.id == bindparam('row_id')).values(
+        name_norm=bindparam('name_norm'),
+        description_norm=bindparam('description_norm'),
+    )
+    while True:
+        rows = connection.execute(select).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'row_id': id, 'name_norm': normalize_text(name),
+             'description_norm': normalize_text(description)}
+            for id, name, description in rows
+        ])
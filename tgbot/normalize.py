@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Text normalization helpers for GOST designations and search queries.
+
+The same normalization is applied to indexed data (once, at ingest) and
+to user queries, so that "ГОСТ  2.105", "гост 2.105", "ГОСТ P 2.105" typed
+with a Latin "P", "ГОСТ 2.105–95" with an en dash and "ёлка"/"елка" all
+match each other.
+"""
+
+import re
+
+
+# Latin letters whose capitals look like Cyrillic ones, after casefolding.
+# Designations are Cyrillic, so a word whose Latin letters all have a
+# look-alike ("ГOCT", "P") is folded into Cyrillic. A word with other Latin
+# letters ("ISO/IEC", "EN") is Latin, and its Cyrillic look-alikes are
+# folded into Latin instead ("ISО" typed with a Cyrillic "О").
+HOMOGLYPHS = str.maketrans({
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у',
+})
+LATIN_HOMOGLYPHS = {ord(cyrillic): chr(latin) for latin, cyrillic in HOMOGLYPHS.items()}
+# Folded in any word
+VARIANTS = str.maketrans({
+    'ё': 'е',
+    # Dash variants
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-',
+    '―': '-', '−': '-',
+})
+
+# Bump when normalize_text() output changes, so stored normalized data
+# (database columns, snapshots) is recomputed
+NORMALIZER_VERSION = 2
+
+_WORD_RE = re.compile(r'[^\W\d_]+')
+_OTHER_LATIN_RE = re.compile('[{}]'.format(''.join(
+    sorted(set('abcdefghijklmnopqrstuvwxyz') - {chr(char) for char in HOMOGLYPHS})
+)))
+_WHITESPACE_RE = re.compile(r'\s+')
+# Punctuation that carries no meaning in designations: quotes, brackets, №, ...
+_PUNCTUATION_RE = re.compile(r'[^\w\s./-]|_')
+_DASH_RE = re.compile(r'\s*-\s*')
+# "гост2.105" -> "гост 2.105"
+_LETTER_DIGIT_RE = re.compile(r'(?<=[^\W\d_])(?=\d)')
+_DESIGNATION_PREFIX_RE = re.compile(r'^\D+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a designation or query for matching.
+
+    Args:
+        text: Raw text (GOST name, description or user query).
+
+    Returns:
+        Casefolded text with look-alike letters folded into the script of
+        their word (see HOMOGLYPHS), ё folded into е, unified dashes,
+        punctuation dropped and whitespace collapsed.
+    """
+    if not text:
+        return ''
+    text = text.casefold().translate(VARIANTS)
+    text = _WORD_RE.sub(_fold_homoglyphs, text)
+    text = _PUNCTUATION_RE.sub(' ', text)
+    text = _DASH_RE.sub('-', text)
+    text = _LETTER_DIGIT_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def _fold_homoglyphs(match) -> str:
+    word = match.group()
+    if _OTHER_LATIN_RE.search(word):
+        return word.translate(LATIN_HOMOGLYPHS)
+    return word.translate(HOMOGLYPHS)
+
+
+def designation_number(key: str) -> str:
+    """
+    Strip the leading letters ("гост р", "гост iso") from a normalized name.
+
+    Args:
+        key: Normalized GOST name, e.g. "гост р 52857-2007".
+
+    Returns:
+        The bare number ("52857-2007"), or an empty string if there is none.
+    """
+    return _DESIGNATION_PREFIX_RE.sub('', key)
+
+
+def like_pattern(text: str) -> str:
+    """
+    Build a LIKE pattern matching normalized columns that contain the text.
+
+    Args:
+        text: Raw query.
+
+    Returns:
+        '%<normalized query>%'. Normalization drops '%' and '_', so the
+        query itself never contains LIKE wildcards.
+    """
+    return '%' + normalize_text(text) + '%'
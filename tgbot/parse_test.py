@@ -4,15 +4,46 @@
 Tests for GOST parsing tools and data sources.
 """
 
+import asyncio
+from datetime import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 
+from aiogram.filters import CommandObject
+import aiohttp
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from tgbot.documents import DocumentCache, get_document, read_document, remember_file_id
+from tgbot import history, ingest
+from tgbot.fulltext import (
+    extract_text, index_document, index_text, search_passages, split_passages, tokenize,
+)
+from tgbot.models import Base, Document, Gost, GostReference, Passage, Subscription, init_db
+from tgbot.normalize import like_pattern, normalize_text
 from tgbot.parse_tools import (
+    EDITION_MATCH,
+    EXACT_MATCH,
+    NAME_MATCH,
+    PREFIX_MATCH,
+    GostRow,
     get_search_list,
     get_search_list_db,
+    get_search_list_online,
+    iter_search_rows,
     list_available_sources,
+    match_rank,
 )
 from tgbot.data_sources import (
+    DATA_SOURCE_CLASSES,
+    FetchedResponse,
     GostDataSource,
     GostRuDataSource,
     DocsCntdRuDataSource,
@@ -21,8 +52,41 @@ from tgbot.data_sources import (
     FilesStroyinfRuDataSource,
     InternetLawRuDataSource,
     LibGostRuDataSource,
+    afetch_from_source,
+    configure_sources,
     get_all_data_sources,
     fetch_from_all_sources,
+    fetch_from_source,
+    run_sync,
+    save_gosts_to_db,
+)
+from tgbot import profiling
+from tgbot.source_config import SourceConfig, SourceConfigError
+from tgbot.search_index import PrefixIndex
+from tgbot.snapshot import Snapshot, SnapshotError, write_snapshot
+from tgbot.startup_bench import loaded_heavy_modules
+from tgbot.storage import BaseCache, MemoryCache, RedisCache, create_fsm_storage
+from tgbot.lazy import is_available
+from tgbot.loadtest import LoadTest, percentile, zipf_queries
+from tgbot.references import (
+    REFERENCES,
+    REPLACES,
+    extract_references,
+    rebuild_closure,
+    rebuild_references,
+    referenced_by,
+    references_of,
+    replaced_by,
+    replaces,
+)
+from tgbot.replay import ReplayServer, replay_source, route_key
+from tgbot.subscriptions import (
+    build_notifications,
+    list_subscriptions,
+    send_notifications,
+    split_message,
+    subscribe,
+    unsubscribe,
 )
 
 
@@ -105,58 +169,127 @@ class TestDataSources(unittest.TestCase):
         self.assertEqual(source.base_url, 'http://libgost.ru')
 
 
+class FakeResponse:
+    """aiohttp response stand-in serving a fixed body."""
+    
+    def __init__(self, body, status=200, content_type='text/html', delay=0.0):
+        self.content = body.encode('utf-8') if isinstance(body, str) else body
+        self.status = status
+        self.headers = {'Content-Type': content_type}
+        self.charset = 'utf-8'
+        self.url = 'http://test.invalid/'
+        self.delay = delay
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        pass
+    
+    async def read(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.content
+    
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(MagicMock(), (), status=self.status)
+
+
+class FakeClientSession:
+    """aiohttp.ClientSession stand-in answering GETs with canned responses."""
+    
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+    
+    def get(self, url, params=None, timeout=None, trace_request_ctx=None):
+        self.urls.append(url)
+        if len(self.responses) > 1:
+            return self.responses.pop(0)
+        return self.responses[0]
+
+
 class TestMockedDataSources(unittest.TestCase):
     """Test data sources with mocked HTTP responses."""
     
-    @patch('tgbot.data_sources.requests.get')
-    def test_gost_ru_fetch_with_mock(self, mock_get):
+    def test_gost_ru_fetch_with_mock(self):
         """Test GostRuDataSource with mocked response."""
-        # Mock the initial page response
-        mock_page_response = MagicMock()
-        mock_page_response.status_code = 200
-        mock_page_response.content = b'<html><a href="/test.csv">CSV</a></html>'
-        
-        # Mock the CSV response
-        mock_csv_response = MagicMock()
-        mock_csv_response.status_code = 200
-        mock_csv_response.content = (
+        page = FetchedResponse('https://www.gost.ru/', 200, {},
+                               b'<html><a href="/test.csv">CSV</a></html>')
+        csv = FetchedResponse('https://www.gost.ru/test.csv', 200, {}, (
             'Name;Description\n'
             'ГОСТ 12345-67;Test standard\n'
             'ГОСТ 89012-34;Another standard\n'
-        ).encode('cp1251')
-        
-        mock_get.side_effect = [mock_page_response, mock_csv_response]
+        ).encode('cp1251'))
         
         source = GostRuDataSource()
-        # The fetch might fail due to XPath not matching, but it shouldn't crash
-        gosts = source.fetch_gosts()
-        self.assertIsInstance(gosts, list)
+        with patch.object(GostDataSource, 'arequest', side_effect=[page, csv]) as mock_request:
+            gosts = source.fetch_gosts()
+        self.assertEqual([g['name'] for g in gosts], ['ГОСТ 12345-67', 'ГОСТ 89012-34'])
+        self.assertEqual(mock_request.call_args.args[0], 'https://www.gost.ru/test.csv')
     
-    @patch('tgbot.data_sources.requests.get')
-    def test_lib_gost_ru_fetch_with_mock(self, mock_get):
+    def test_lib_gost_ru_fetch_with_mock(self):
         """Test LibGostRuDataSource with mocked response."""
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.text = '''
+        session = FakeClientSession(FakeResponse('''
         <html>
             <div class="news">
                 <a href="/gost/123">ГОСТ 12345-67</a>
                 <p>Description of the standard</p>
             </div>
         </html>
-        '''
-        mock_response.raise_for_status = MagicMock()
-        mock_get.return_value = mock_response
+        '''))
         
         source = LibGostRuDataSource()
-        gosts = source.fetch_gosts()
-        self.assertIsInstance(gosts, list)
+        with patch('tgbot.data_sources.get_client_session', return_value=session):
+            gosts = source.fetch_gosts()
+        self.assertEqual(gosts, [{'name': 'ГОСТ 12345-67',
+                                  'description': 'Description of the standard',
+                                  'url': 'http://libgost.ru/gost/123'}])
+    
+    def test_http_errors_yield_no_gosts(self):
+        """Test that a failing source returns an empty list."""
+        session = FakeClientSession(FakeResponse('', status=503))
+        with patch('tgbot.data_sources.get_client_session', return_value=session):
+            self.assertEqual(LibGostRuDataSource().fetch_gosts(), [])
+
+
+class TestAsyncDataSources(unittest.IsolatedAsyncioTestCase):
+    """Test the asynchronous fetch interface."""
+    
+    async def test_concurrency_limit(self):
+        """Test that no more than 'concurrency' requests run at once."""
+        in_flight = []
+        peak = []
+        
+        class CountingResponse(FakeResponse):
+            async def read(self):
+                in_flight.append(1)
+                peak.append(len(in_flight))
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+                return self.content
+        
+        source = LibGostRuDataSource(SourceConfig(concurrency=2))
+        session = FakeClientSession(CountingResponse('<html></html>'))
+        with patch('tgbot.data_sources.get_client_session', return_value=session):
+            pages = await asyncio.gather(*(source.aget_html(source.base_url)
+                                           for _ in range(6)))
+        self.assertEqual(len(pages), 6)
+        self.assertEqual(max(peak), 2)
+    
+    async def test_sync_plugins_run_in_a_thread(self):
+        """Test that sources implementing only fetch_gosts() still work."""
+        gosts = await afetch_from_source(DummyDataSource())
+        self.assertEqual(gosts[0]['source'], 'dummy')
+        with self.assertRaises(TypeError):
+            GostDataSource()
 
 
 class TestFetchFromAllSources(unittest.TestCase):
     """Test the combined fetch functionality."""
     
-    @patch('tgbot.data_sources.fetch_from_source')
+    @patch('tgbot.data_sources.afetch_from_source')
     def test_fetch_from_all_sources_deduplication(self, mock_fetch):
         """Test that duplicate GOSTs are removed when fetching from all sources."""
         # Simulate different sources returning overlapping results
@@ -177,5 +310,1036 @@ class TestFetchFromAllSources(unittest.TestCase):
         self.assertEqual(len(names), len(set(names)))  # All unique
 
 
+class TestFixtureCorpus(unittest.TestCase):
+    """Replay the synthetic source pages through the real parsers."""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ReplayServer().start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+    
+    def test_every_source_has_fixtures(self):
+        """Test that the corpus covers all built-in sources."""
+        self.assertEqual(set(self.server.manifest),
+                         {source_class.name for source_class in DATA_SOURCE_CLASSES})
+    
+    def test_expected_record_counts(self):
+        """Test that every parser finds all GOSTs on its fixture pages."""
+        for source_class in DATA_SOURCE_CLASSES:
+            with self.subTest(source=source_class.name):
+                result = replay_source(self.server, source_class)
+                self.assertTrue(result.ok, f"{result.records} records, "
+                                           f"expected {result.expected}")
+                self.assertGreater(result.records_per_second, 0)
+    
+    def test_protect_gost_ru_result_tables(self):
+        """Test that protect.gost.ru rows yield designation and title."""
+        source = ProtectGostRuDataSource(
+            SourceConfig(base_url=self.server.base_url('protect.gost.ru')))
+        gosts = source.fetch_gosts()
+        self.assertEqual(gosts[0]['name'], 'ГОСТ Р 21.101-2020')
+        self.assertTrue(gosts[0]['description'].startswith('Система проектной документации'))
+        self.assertIn('document.aspx', gosts[0]['url'])
+    
+    def test_route_key(self):
+        """Test that encoded and plain queries address the same fixture."""
+        self.assertEqual(route_key('/v.aspx', 's=%D0%93%D0%9E%D0%A1%D0%A2+%D0%A0'),
+                         route_key('/v.aspx', 's=ГОСТ Р'))
+        self.assertEqual(route_key('/a', 'b=2&a=1'), route_key('/a', 'a=1&b=2'))
+
+
+class TestPrefixIndex(unittest.TestCase):
+    """Test the autocomplete prefix index."""
+    
+    def setUp(self):
+        self.index = PrefixIndex([
+            ('ГОСТ 2.105-95', 'Общие требования к текстовым документам'),
+            ('ГОСТ 2.104-2006', 'Основные надписи'),
+            ('ГОСТ Р 52857.1-2007', 'Сосуды и аппараты'),
+            ('ГОСТ 21.101-97', 'Основные требования к проектной документации'),
+        ])
+    
+    def test_prefix_search_is_case_insensitive(self):
+        """Test that lowercase queries match uppercase designations."""
+        names = [name for name, _ in self.index.search('гост 2.10')]
+        self.assertEqual(names, ['ГОСТ 2.104-2006', 'ГОСТ 2.105-95'])
+    
+    def test_search_by_bare_number(self):
+        """Test that designations can be found without the ГОСТ prefix."""
+        names = [name for name, _ in self.index.search('52857')]
+        self.assertEqual(names, ['ГОСТ Р 52857.1-2007'])
+    
+    def test_limit_and_empty_query(self):
+        """Test that the result limit is honoured and empty queries return nothing."""
+        self.assertEqual(len(self.index.search('ГОСТ', limit=2)), 2)
+        self.assertEqual(self.index.search('   '), [])
+    
+    def test_search_is_fast_on_large_index(self):
+        """Test that a keystroke is answered well under 10 ms."""
+        index = PrefixIndex(
+            ('ГОСТ %d.%d-%d' % (i, i % 97, 1950 + i % 70), 'Описание')
+            for i in range(100000)
+        )
+        start = time.perf_counter()
+        for query in ('ГОСТ 1', 'гост 4242', '777', 'ГОСТ 99999.'):
+            index.search(query, limit=20)
+        elapsed = (time.perf_counter() - start) / 4
+        self.assertLess(elapsed, 0.01)
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test the memory-mapped catalog snapshot."""
+    
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.snap')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+    
+    def test_round_trip_and_search(self):
+        """Test that a written snapshot can be mapped and searched."""
+        count = write_snapshot([
+            ('ГОСТ 2.105-95', 'Общие требования к текстовым документам'),
+            ('ГОСТ Р 52857.1-2007', 'Сосуды и аппараты'),
+            ('ГОСТ 2.104-2006', 'Основные надписи'),
+        ], self.path)
+        self.assertEqual(count, 3)
+        
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 3)
+            self.assertEqual(snapshot.get(1), ('ГОСТ Р 52857.1-2007', 'Сосуды и аппараты'))
+            names = [name for name, _ in snapshot.search('гост 2.10')]
+            self.assertEqual(names, ['ГОСТ 2.104-2006', 'ГОСТ 2.105-95'])
+            names = [name for name, _ in snapshot.search('52857')]
+            self.assertEqual(names, ['ГОСТ Р 52857.1-2007'])
+    
+    def test_rejects_foreign_file(self):
+        """Test that files without the snapshot header are rejected."""
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot' * 10)
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+    
+    def test_rejects_other_normalizer_version(self):
+        """Test that snapshots keyed by another normalize_text() are rejected."""
+        with patch('tgbot.snapshot.NORMALIZER_VERSION', 1):
+            write_snapshot([('ГОСТ ISO 1', '')], self.path)
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+
+
+class TestLeanSearch(unittest.TestCase):
+    """Test the lightweight row search path against an in-memory database."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Gost(name='ГОСТ 2.105-95', description='Общие требования'),
+            Gost(name='ГОСТ 2.104-2006', description='Основные надписи'),
+            Gost(name='ГОСТ 21.101-97', description='См. ГОСТ 2.105-95'),
+        ])
+        self.session.commit()
+        patcher = patch('tgbot.parse_tools.session', self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_rows_are_not_orm_objects(self):
+        """Test that lean rows are slotted records, not session-tracked Gosts."""
+        rows = get_search_list_db('2.105', lean=True)
+        self.assertTrue(all(isinstance(row, GostRow) for row in rows))
+        self.assertEqual(len(self.session.identity_map), 0)
+    
+    def test_name_matches_come_first_without_duplicates(self):
+        """Test that name matches precede description-only matches."""
+        names = [row.name for row in iter_search_rows('2.105')]
+        self.assertEqual(names, ['ГОСТ 2.105-95', 'ГОСТ 21.101-97'])
+    
+    def test_limit(self):
+        """Test that the limit applies across name and description matches."""
+        self.assertEqual(len(list(iter_search_rows('ГОСТ', limit=2))), 2)
+        self.assertEqual(len(get_search_list_db('2.105', limit=1)), 1)
+    
+    def test_get_search_list_uses_rows(self):
+        """Test that the combined search returns [name, description] pairs."""
+        self.assertEqual(get_search_list('2.104'),
+                         [['ГОСТ 2.104-2006', 'Основные надписи']])
+    
+    def test_query_variants_match_normalized_columns(self):
+        """Test that case, Latin look-alikes, dashes and ё do not matter."""
+        for query in ('гост 2.105-95', 'ГOCT 2.105–95', 'ГОСТ2.105 - 95'):
+            names = [row.name for row in iter_search_rows(query)]
+            self.assertEqual(names, ['ГОСТ 2.105-95', 'ГОСТ 21.101-97'], query)
+        self.assertEqual(len(get_search_list_db('ОБЩИЕ ТPEБОВАНИЯ')), 1)
+    
+    def test_like_wildcards_are_literal(self):
+        """Test that % and _ in a query do not act as wildcards."""
+        self.assertEqual(list(iter_search_rows('2_105')), [])
+        self.assertEqual(list(iter_search_rows('2%05')), [])
+
+
+class TestRanking(unittest.TestCase):
+    """Test the relevance order of search results."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all(
+            [Gost(name=f'ГОСТ 3.{1000 + i}-80', description=f'См. ГОСТ 2.105-95, раздел {i}')
+             for i in range(50)] + [
+            Gost(name='ГОСТ 12.2.105-84', description='Оборудование'),
+            Gost(name='ГОСТ 2.1051-2001', description='Вымышленный стандарт'),
+            Gost(name='ГОСТ 2.105-2019', description='Общие требования к текстовым документам'),
+            Gost(name='ГОСТ 2.105-95', description='Общие требования к текстовым документам'),
+        ])
+        self.session.commit()
+        patcher = patch('tgbot.parse_tools.session', self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_designation_beats_description_matches(self):
+        """Test that a bare number finds the standard before its mentions."""
+        names = [row.name for row in iter_search_rows('2.105', limit=4)]
+        self.assertEqual(names, ['ГОСТ 2.105-95', 'ГОСТ 2.105-2019',
+                                 'ГОСТ 2.1051-2001', 'ГОСТ 12.2.105-84'])
+    
+    def test_exact_edition_first(self):
+        """Test that a full designation puts that edition before the others."""
+        names = [gost.name for gost in get_search_list_db('ГОСТ 2.105-2019', limit=2)]
+        self.assertEqual(names[0], 'ГОСТ 2.105-2019')
+    
+    def test_description_matches_are_ranked_after_names(self):
+        """Test that all name matches precede description-only matches."""
+        rows = list(iter_search_rows('2.105'))
+        self.assertEqual(len(rows), 54)
+        self.assertTrue(all(row.name.startswith('ГОСТ 3.') for row in rows[4:]))
+    
+    def test_match_rank_agrees_with_sql(self):
+        """Test that the online ranking uses the same tiers as the database."""
+        query = normalize_text('2.105')
+        ranks = [match_rank(query, normalize_text(gost.name), normalize_text(gost.description))
+                 for gost in get_search_list_db('2.105')]
+        self.assertEqual(ranks, sorted(ranks))
+        self.assertEqual(ranks[:4], [EDITION_MATCH, EDITION_MATCH, PREFIX_MATCH, NAME_MATCH])
+        self.assertEqual(match_rank(normalize_text('ГОСТ 2.105-95'), 'гост 2.105-95', ''),
+                         EXACT_MATCH)
+        self.assertIsNone(match_rank(query, 'гост 2.104-2006', 'основные надписи'))
+    
+    def test_online_results_are_ranked(self):
+        """Test that online results are filtered, ranked and limited."""
+        gosts = [
+            {'name': 'ГОСТ 21.101-97', 'description': 'См. ГОСТ 2.105-95'},
+            {'name': 'ГОСТ 2.104-2006', 'description': 'Основные надписи'},
+            {'name': 'ГОСТ 2.105-95', 'description': 'Общие требования'},
+        ]
+        with patch('tgbot.parse_tools.afetch_from_all_sources', return_value=gosts):
+            results = get_search_list_online('2.105', limit=1)
+        self.assertEqual(results, [gosts[2]])
+
+
+class TestNormalize(unittest.TestCase):
+    """Test query normalization and the normalized shadow columns."""
+    
+    def test_normalize_text(self):
+        """Test homoglyph, ё, dash, punctuation and spacing folding."""
+        self.assertEqual(normalize_text('ГОСТ P 52857.1—2007'), 'гост р 52857.1-2007')
+        self.assertEqual(normalize_text('«Ёмкости»,  сосуды'), 'емкости сосуды')
+        self.assertEqual(normalize_text('ГОСТ2.105'), 'гост 2.105')
+        self.assertEqual(normalize_text('ГОСТ P ISO/IEC 17025'), 'гост р iso/iec 17025')
+        self.assertEqual(normalize_text('ГОСТ ISО/IЕС 17025'), 'гост iso/iec 17025')
+        self.assertEqual(normalize_text(None), '')
+        self.assertEqual(like_pattern('50%_x'), '%50 х%')
+    
+    def test_columns_are_filled_on_assignment(self):
+        """Test that setting name/description fills the shadow columns."""
+        gost = Gost(name='ГОСТ P 1.0', description='Ёлочные игрушки')
+        self.assertEqual(gost.name_norm, 'гост р 1.0')
+        self.assertEqual(gost.description_norm, 'елочные игрушки')
+    
+    def test_init_db_backfills_existing_rows(self):
+        """Test that rows stored before the columns existed get normalized."""
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            connection.execute(
+                'CREATE TABLE gosts (id INTEGER PRIMARY KEY, name VARCHAR, '
+                'description VARCHAR, source VARCHAR, url VARCHAR)'
+            )
+            connection.execute(
+                "INSERT INTO gosts (name, description) VALUES ('ГОСТ Р 1.0', 'Текст')"
+            )
+        init_db(engine)
+        row = engine.execute('SELECT name_norm, description_norm FROM gosts').fetchone()
+        self.assertEqual(tuple(row), ('гост р 1.0', 'текст'))
+        # The trigram index is created and filled as well
+        rows = engine.execute("SELECT rowid FROM gosts_fts WHERE gosts_fts MATCH '\"р 1.0\"'")
+        self.assertEqual(len(rows.fetchall()), 1)
+    
+    def test_init_db_renormalizes_older_columns(self):
+        """Test that columns written by an older normalizer are recomputed."""
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                "INSERT INTO gosts (name, name_norm) VALUES ('ГОСТ ISO 1', 'гост isо 1')"
+            )
+        init_db(engine)
+        self.assertEqual(engine.execute('SELECT name_norm FROM gosts').scalar(), 'гост iso 1')
+        session = sessionmaker(bind=engine)()
+        with patch('tgbot.parse_tools.session', session):
+            self.assertEqual([row.name for row in iter_search_rows('ISO 1')], ['ГОСТ ISO 1'])
+
+
+class TestIngest(unittest.TestCase):
+    """Test the columnar ingest path and its row-by-row fallback."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Gost(name='ГОСТ 2.105-95', description='Старое описание', url='http://a'),
+            Gost(name='ГОСТ 2.104-2006', description='Основные надписи'),
+        ])
+        self.session.commit()
+        for target in ('tgbot.ingest.session', 'tgbot.data_sources.session',
+                       'tgbot.history.session', 'tgbot.references.session',
+                       'tgbot.fulltext.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('tgbot.data_sources.init_db')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.incoming = [
+            {'name': 'ГОСТ 2.105-95', 'description': 'Общие требования'},
+            # Same designation spelled with Latin letters by a lower priority source
+            {'name': 'ГOCT 2.105-95', 'description': 'Дубликат', 'source': 'other'},
+            {'name': 'ГОСТ 21.101-97', 'description': 'СПДС', 'url': 'http://c'},
+        ]
+    
+    def stored(self):
+        return {gost.name: (gost.description, gost.url)
+                for gost in self.session.query(Gost)}
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_diff(self):
+        """Test that inserts, updates and deletes are set differences on the designation."""
+        incoming = ingest.deduplicate(ingest.records_to_table(self.incoming))
+        self.assertEqual(incoming['description'].to_pylist(), ['Общие требования', 'СПДС'])
+        
+        diff = ingest.diff_tables(incoming, ingest.current_table())
+        self.assertEqual(diff.inserts['name'].to_pylist(), ['ГОСТ 21.101-97'])
+        self.assertEqual(diff.updates.to_pylist()[0]['url'], 'http://a')
+        self.assertEqual(diff.deletes['name'].to_pylist(), ['ГОСТ 2.104-2006'])
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_normalize_array_matches_normalize_text(self):
+        """Test that vectorized normalization agrees with the Python one."""
+        import pyarrow as pa
+        values = ['ГОСТ P 52857.1—2007', '«Ёмкости»,  сосуды', 'ГОСТ2.105',
+                  'a_b%c\x0b - d', 'Straße', 'ГОСТ P ISO/IEC 17025', 'ГOCT ёлка', 'ISО Сварка', '', None]
+        self.assertEqual(ingest.normalize_array(pa.array(values)).to_pylist(),
+                         [normalize_text(value) for value in values])
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_bulk_save(self):
+        """Test that the bulk path inserts, updates and optionally deletes."""
+        self.assertEqual(save_gosts_to_db(self.incoming), 1)
+        self.session.expire_all()
+        stored = self.stored()
+        self.assertEqual(stored['ГОСТ 2.105-95'], ('Общие требования', 'http://a'))
+        self.assertIn('ГОСТ 2.104-2006', stored)
+        self.assertEqual(self.session.query(Gost).filter(
+            Gost.name_norm == 'гост 21.101-97').count(), 1)
+        
+        self.assertEqual(save_gosts_to_db(self.incoming, delete=True), 0)
+        self.session.expire_all()
+        self.assertNotIn('ГОСТ 2.104-2006', self.stored())
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_delete_spares_failed_sources(self):
+        """Test that deleting only drops rows of sources that returned records."""
+        self.session.add_all([
+            Gost(name='ГОСТ 7.32-2017', description='Отчёт', source='a'),
+            Gost(name='ГОСТ 7.1-2003', description='Библиография', source='b'),
+            Document(gost_name='ГОСТ 7.32-2017', sha256='x'),
+            Passage(gost_name='ГОСТ 7.32-2017', position=0, text='Отчёт', length=1),
+            Subscription(chat_id=1, name_norm='гост 7.32-2017', name='ГОСТ 7.32-2017'),
+        ])
+        self.session.commit()
+        # Source "b" failed and returned nothing
+        save_gosts_to_db([{'name': 'ГОСТ 7.0-99', 'description': 'Каталог', 'source': 'a'}],
+                         delete=True)
+        self.session.expire_all()
+        stored = self.stored()
+        self.assertNotIn('ГОСТ 7.32-2017', stored)
+        self.assertIn('ГОСТ 7.1-2003', stored)
+        # Untagged rows belong to no source that answered
+        self.assertIn('ГОСТ 2.104-2006', stored)
+        self.assertEqual(self.session.query(Document).count(), 0)
+        self.assertEqual(self.session.query(Passage).count(), 0)
+        self.assertEqual(self.session.query(Subscription).count(), 1)
+        
+        # Nothing fetched at all deletes nothing
+        save_gosts_to_db([], delete=True)
+        self.assertIn('ГОСТ 7.0-99', self.stored())
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_parquet_round_trip(self):
+        """Test that a catalog snapshot survives a Parquet round trip."""
+        table = ingest.current_table()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'catalog.parquet')
+            ingest.write_parquet(table, path)
+            self.assertTrue(ingest.read_parquet(path).equals(table))
+    
+    def test_row_fallback(self):
+        """Test that without pyarrow GOSTs are saved one by one."""
+        with patch('tgbot.ingest.HAS_ARROW', False):
+            self.assertEqual(save_gosts_to_db(self.incoming), 1)
+            with self.assertRaises(ImportError):
+                save_gosts_to_db(self.incoming, delete=True)
+        self.assertEqual(self.stored()['ГОСТ 2.105-95'], ('Общие требования', 'http://a'))
+
+
+class TestHistory(unittest.TestCase):
+    """Test the version history written during ingest."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add(Gost(name='ГОСТ 2.105-95', description='Старое описание'))
+        self.session.commit()
+        for target in ('tgbot.ingest.session', 'tgbot.data_sources.session',
+                       'tgbot.history.session', 'tgbot.references.session',
+                       'tgbot.fulltext.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('tgbot.data_sources.init_db')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def check_history(self):
+        before = datetime.utcnow()
+        save_gosts_to_db([
+            {'name': 'ГОСТ 2.105-95', 'description': 'Общие требования'},
+            {'name': 'ГОСТ 2.104-2006', 'description': 'Основные надписи'},
+        ])
+        after = datetime.utcnow()
+        
+        versions = history.history_of('гост 2.105-95')
+        self.assertEqual([(v.revision, v.description) for v in versions],
+                         [(1, 'Старое описание'), (2, 'Общие требования')])
+        self.assertIsNone(versions[0].valid_from)
+        self.assertEqual(versions[0].valid_to, versions[1].valid_from)
+        self.assertEqual(history.version_at('ГОСТ 2.105-95', before).description,
+                         'Старое описание')
+        self.assertEqual(history.version_at('ГОСТ 2.105-95', after).description,
+                         'Общие требования')
+        self.assertIsNone(history.version_at('ГОСТ 2.104-2006', before))
+        self.assertEqual([v.name for v in history.changed_since(before)], ['ГОСТ 2.105-95'])
+        self.assertEqual(len(history.changed_since(before, include_new=True)), 2)
+        
+        # Unchanged content and url-only changes add no versions
+        save_gosts_to_db([
+            {'name': 'ГОСТ 2.105-95', 'description': 'Общие требования', 'url': 'http://a'},
+        ])
+        self.assertEqual(len(history.history_of('ГОСТ 2.105-95')), 2)
+    
+    def test_readded_gost_continues_its_revisions(self):
+        """Test that a GOST removed and added again does not restart at revision 1."""
+        entry = {'name_norm': 'гост 1-00', 'name': 'ГОСТ 1-00', 'description': 'v1'}
+        history.record_versions([entry], datetime(2020, 1, 1))
+        history.close_versions(['гост 1-00'], datetime(2021, 1, 1))
+        history.record_versions([entry], datetime(2022, 1, 1))
+        self.assertEqual([v.revision for v in history.history_of('ГОСТ 1-00')], [1, 2])
+        self.assertEqual(len(history.changed_since(datetime(2021, 6, 1))), 1)
+    
+    @unittest.skipUnless(ingest.HAS_ARROW, 'pyarrow is not installed')
+    def test_bulk_path(self):
+        """Test history written by the columnar ingest path."""
+        self.check_history()
+        save_gosts_to_db([{'name': 'ГОСТ 2.105-95', 'description': 'Общие требования'}],
+                         delete=True)
+        self.assertIsNotNone(history.history_of('ГОСТ 2.104-2006')[0].valid_to)
+        self.assertIsNone(history.version_at('ГОСТ 2.104-2006', datetime.utcnow()))
+    
+    def test_row_path(self):
+        """Test history written by the row-by-row ingest path."""
+        with patch('tgbot.ingest.HAS_ARROW', False):
+            self.check_history()
+
+
+class TestReferences(unittest.TestCase):
+    """Test the cross-reference graph and the supersession closure."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        for target in ('tgbot.ingest.session', 'tgbot.data_sources.session',
+                       'tgbot.history.session', 'tgbot.references.session',
+                       'tgbot.parse_tools.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('tgbot.data_sources.init_db')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        save_gosts_to_db([
+            {'name': 'ГОСТ 2.105-2019', 'description': 'Общие требования. Взамен ГОСТ 2.105-95'},
+            {'name': 'ГОСТ 2.105-95', 'description': 'Взамен ГОСТ 2.105-79, ГОСТ 2.906-71'},
+            {'name': 'ГОСТ 21.101-2020', 'description': 'СПДС. См. ГОСТ 2.105-2019 и ГОСТ 2.104-2006'},
+        ])
+    
+    def test_extract_references(self):
+        """Test that only the designations after "взамен" are replaced ones."""
+        self.assertEqual(extract_references(
+            'Взамен ГОСТ 2.105-79, ГОСТ 2.906–71 и ГOCT 2.907-71 (в части разд. 3). '
+            'Ссылки: ГОСТ Р ИСО 9001-2015; ГОСТ2.104-2006, ГОСТ 2.105-79'
+        ), [
+            (REPLACES, 'гост 2.105-79'), (REPLACES, 'гост 2.906-71'),
+            (REPLACES, 'гост 2.907-71'), (REFERENCES, 'гост р исо 9001-2015'),
+            (REFERENCES, 'гост 2.104-2006'),
+        ])
+        self.assertEqual(extract_references(None), [])
+    
+    def test_edges_are_indexed_both_ways(self):
+        """Test outgoing and incoming reference lookups."""
+        self.assertEqual(references_of('гост 21.101-2020'), ['ГОСТ 2.104-2006', 'ГОСТ 2.105-2019'])
+        self.assertEqual(referenced_by('ГОСТ 2.105-2019'), ['ГОСТ 21.101-2020'])
+        self.assertEqual(references_of('ГОСТ 2.105-2019'), [])
+    
+    def test_supersession_closure(self):
+        """Test that chains of replaced editions are followed transitively."""
+        self.assertEqual(replaces('ГОСТ 2.105-2019'), [
+            ('ГОСТ 2.105-95', 1), ('ГОСТ 2.105-79', 2), ('ГОСТ 2.906-71', 2)])
+        self.assertEqual(replaced_by('ГОСТ 2.105-79'), [
+            ('ГОСТ 2.105-95', 1), ('ГОСТ 2.105-2019', 2)])
+    
+    def test_changed_description_replaces_edges(self):
+        """Test that re-ingesting a GOST rebuilds its edges and the closure."""
+        save_gosts_to_db([{'name': 'ГОСТ 2.105-95', 'description': 'Взамен ГОСТ 2.105-68'}])
+        self.assertEqual(replaces('ГОСТ 2.105-2019'), [
+            ('ГОСТ 2.105-95', 1), ('ГОСТ 2.105-68', 2)])
+        self.assertEqual(replaced_by('ГОСТ 2.906-71'), [])
+    
+    def test_cycles_terminate(self):
+        """Test that contradictory "взамен" chains do not loop forever."""
+        save_gosts_to_db([{'name': 'ГОСТ 2.105-79', 'description': 'Взамен ГОСТ 2.105-2019'}])
+        self.assertEqual([name for name, _ in replaces('ГОСТ 2.105-79')],
+                         ['ГОСТ 2.105-2019', 'ГОСТ 2.105-95', 'ГОСТ 2.906-71'])
+    
+    def test_branching_cycles_stay_linear(self):
+        """Test that GOSTs replacing each other yield one pair each, quickly."""
+        names = [f'ГОСТ 9.{number}-80' for number in range(3)]
+        save_gosts_to_db([
+            {'name': name, 'description': 'Взамен ' + ', '.join(other for other in names if other != name)}
+            for name in names
+        ])
+        start = time.perf_counter()
+        rebuild_closure()
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(replaces(names[0]), [(names[1], 1), (names[2], 1)])
+
+    def test_rebuild_references(self):
+        """Test that the graph can be rebuilt from stored descriptions."""
+        self.session.query(GostReference).delete()
+        self.session.commit()
+        self.assertEqual(rebuild_references(), 5)
+        self.assertEqual(len(replaces('ГОСТ 2.105-2019')), 3)
+    
+    def test_replaced_command(self):
+        """Test /replaced for a withdrawn standard that is not in the catalog."""
+        from tgbot.bot import show_replacements
+        
+        message = MagicMock(answer=AsyncMock())
+        asyncio.run(show_replacements(message, CommandObject(command='replaced',
+                                                             args='ГОСТ 2.105-79')))
+        text = message.answer.call_args.args[0]
+        self.assertEqual(text, 'ГОСТ 2.105-79\n\nЗаменён на:\nГОСТ 2.105-95\nГОСТ 2.105-2019 (шаг 2)')
+
+
+class TestSubscriptions(unittest.IsolatedAsyncioTestCase):
+    """Test subscriptions and the batched change notifications."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        for target in ('tgbot.subscriptions.session', 'tgbot.history.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_subscribe_and_unsubscribe(self):
+        """Test that subscriptions are unique per chat and designation."""
+        self.assertTrue(subscribe(1, 'ГОСТ 2.105-95'))
+        self.assertFalse(subscribe(1, 'ГОСТ 2.105-95'))
+        self.assertTrue(subscribe(1, 'ГОСТ 2.104-2006'))
+        self.assertEqual(list_subscriptions(1), ['ГОСТ 2.104-2006', 'ГОСТ 2.105-95'])
+        self.assertTrue(unsubscribe(1, 'гост 2.105-95'))
+        self.assertFalse(unsubscribe(1, 'ГОСТ 2.105-95'))
+        self.assertEqual(list_subscriptions(2), [])
+    
+    def test_notifications_are_grouped_per_chat(self):
+        """Test that each chat gets one message for all its changed GOSTs."""
+        entries = [{'name_norm': normalize_text(name), 'name': name, 'description': 'v1'}
+                   for name in ('ГОСТ 1', 'ГОСТ 2', 'ГОСТ 3')]
+        history.record_versions(entries, datetime(2020, 1, 1))
+        since = datetime(2021, 1, 1)
+        for entry in entries[:2]:
+            entry['description'] = 'v2'
+        history.record_versions(entries, datetime(2021, 6, 1))
+        for chat_id, name in ((1, 'ГОСТ 1'), (1, 'ГОСТ 2'), (2, 'ГОСТ 1'), (3, 'ГОСТ 3')):
+            subscribe(chat_id, name)
+        
+        notifications = build_notifications(since)
+        self.assertEqual(sorted(notifications), [1, 2])
+        self.assertEqual(len(notifications[1]), 1)
+        self.assertIn('ГОСТ 2', notifications[1][0])
+        self.assertEqual(len(split_message(['x' * 3000, 'y' * 3000])), 2)
+    
+    async def test_send_in_paced_batches(self):
+        """Test batching, pacing and dropping chats that blocked the bot."""
+        from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+        subscribe(3, 'ГОСТ 1')
+        sent = []
+        
+        class FakeBot:
+            async def send_message(self, chat_id, text):
+                if chat_id == 3:
+                    raise TelegramForbiddenError(method=MagicMock(), message='blocked')
+                if chat_id == 5:
+                    raise TelegramBadRequest(method=MagicMock(), message='chat not found')
+                if chat_id == 6:
+                    raise aiohttp.ClientConnectionError('reset')
+                sent.append(chat_id)
+        
+        notifications = {1: ['a'], 5: ['x'], 6: ['y'], 2: ['b', 'c'], 3: ['d'], 4: ['e']}
+        start = time.perf_counter()
+        delivered = await send_notifications(FakeBot(), notifications,
+                                             batch_size=2, interval=0.05)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.15)
+        self.assertEqual(delivered, 4)
+        self.assertEqual(sorted(sent), [1, 2, 2, 4])
+        self.assertEqual(list_subscriptions(3), [])
+    
+    async def test_subscribe_command_needs_the_designation(self):
+        """Test that /subscribe does not pick a GOST that merely contains the text."""
+        from tgbot.bot import subscribe_gost
+        
+        self.session.add_all([Gost(name='ГОСТ 12.2.105-84', description='Оборудование'),
+                              Gost(name='ГОСТ 2.105-95', description='Общие требования')])
+        self.session.commit()
+        message = MagicMock(answer=AsyncMock(), chat=MagicMock(id=1))
+        with patch('tgbot.parse_tools.session', self.session):
+            await subscribe_gost(message, CommandObject(command='subscribe', args='2.105'))
+            self.assertEqual(list_subscriptions(1), [])
+            await subscribe_gost(message, CommandObject(command='subscribe', args='гост 2.105-95'))
+        self.assertEqual(list_subscriptions(1), ['ГОСТ 2.105-95'])
+
+
+class TestStartup(unittest.TestCase):
+    """Test that search code starts without scraping/OCR dependencies."""
+    
+    def test_parse_tools_does_not_load_scrapers(self):
+        """Test that importing parse_tools defers aiohttp, bs4, lxml and OCR."""
+        self.assertEqual(loaded_heavy_modules('tgbot.parse_tools'), [])
+    
+    def test_list_sources_does_not_load_scrapers(self):
+        """Test that listing sources defers aiohttp, bs4, lxml and OCR."""
+        # Wall-clock startup time is left to startup_bench.py
+        self.assertEqual(loaded_heavy_modules('tgbot.csv_to_sql', ['--list-sources']), [])
+    
+    @patch('tgbot.bot.close_client_session', new_callable=AsyncMock)
+    def test_bot_upgrades_the_database_first(self, mock_close):
+        """Test that the bot brings an older database up to date before loading the index."""
+        from tgbot import bot
+        
+        calls = MagicMock()
+        calls.create_dispatcher.return_value.start_polling = AsyncMock()
+        with patch.dict('sys.modules', {'tgbot.settings': MagicMock(API_TOKEN='token')}), \
+                patch('tgbot.bot.init_db', calls.init_db), \
+                patch('tgbot.bot.create_dispatcher', calls.create_dispatcher), \
+                patch('tgbot.bot.Bot'), patch('tgbot.bot.REDIS_URL', None), \
+                patch('tgbot.bot.WEBHOOK_URL', None):
+            asyncio.run(bot.main())
+        self.assertEqual([call[0] for call in calls.mock_calls[:2]],
+                         ['init_db', 'create_dispatcher'])
+        # The sources' client session is closed on shutdown
+        mock_close.assert_awaited_once()
+
+
+class DummyDataSource(GostDataSource):
+    """Plugin data source used by the registry tests."""
+    
+    name = 'dummy'
+    base_url = 'http://dummy.invalid'
+    
+    def fetch_gosts(self):
+        return [{'name': 'ГОСТ 0-00', 'description': 'Dummy'}]
+
+
+class TestSourceConfig(unittest.TestCase):
+    """Test per-source configuration and plugin discovery."""
+    
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(configure_sources)
+    
+    def write_config(self, config):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        configure_sources(self.path)
+    
+    def test_disable_and_prioritize_sources(self):
+        """Test that sources can be switched off and reordered by priority."""
+        self.write_config({
+            'defaults': {'timeout': 5},
+            'sources': {
+                'protect.gost.ru': {'enabled': False},
+                'libgost.ru': {'priority': 10, 'rate_limit': 1},
+            },
+        })
+        names = [s.name for s in get_all_data_sources()]
+        self.assertNotIn('protect.gost.ru', names)
+        self.assertEqual(names[0], 'libgost.ru')
+        self.assertIn('protect.gost.ru',
+                      [s.name for s in get_all_data_sources(include_disabled=True)])
+        self.assertEqual(get_all_data_sources()[0].config.rate_limit, 1)
+        self.assertEqual(get_all_data_sources()[1].timeout, 5)
+    
+    def test_plugin_sources_are_loaded(self):
+        """Test that configured plugins join the registry."""
+        self.write_config({'plugins': ['tgbot.parse_test:DummyDataSource',
+                                       'tgbot.parse_test:TestSourceConfig']})
+        sources = get_all_data_sources()
+        self.assertEqual(len(sources), 8)
+        self.assertEqual(sources[-1].name, 'dummy')
+    
+    def test_invalid_settings_are_rejected(self):
+        """Test that unknown or out-of-range settings raise an error."""
+        with self.assertRaises(SourceConfigError):
+            self.write_config({'sources': {'gost.ru': {'speed': 'fast'}}})
+        with self.assertRaises(SourceConfigError):
+            SourceConfig(concurrency=0)
+    
+    def test_rate_limit_spaces_requests(self):
+        """Test that requests to a rate-limited source are spaced out."""
+        source = LibGostRuDataSource(SourceConfig(rate_limit=20, concurrency=3))
+        
+        async def fetch_concurrently():
+            await asyncio.gather(*(source.aget_html(source.base_url) for _ in range(3)))
+        
+        session = FakeClientSession(FakeResponse('<html></html>'))
+        start = time.perf_counter()
+        with patch('tgbot.data_sources.get_client_session', return_value=session):
+            run_sync(fetch_concurrently())
+        self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+
+
+class TestDocuments(unittest.TestCase):
+    """Test the document cache and retrieval."""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = DocumentCache(tmp.name, max_bytes=10 ** 6)
+        
+        # Documents are indexed in a worker thread, on its own session
+        engine = create_engine('sqlite://', poolclass=StaticPool,
+                               connect_args={'check_same_thread': False})
+        Base.metadata.create_all(engine)
+        self.session = scoped_session(sessionmaker(bind=engine))
+        self.addCleanup(self.session.remove)
+        self.session.add(Gost(name='ГОСТ 2.105-95', description='Общие требования',
+                              source='libgost.ru', url='http://libgost.ru/gost/2105'))
+        self.session.commit()
+        for target in ('tgbot.documents.session', 'tgbot.fulltext.session',
+                       'tgbot.references.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_cache_is_content_addressed(self):
+        """Test that identical content is stored once and read back intact."""
+        first = self.cache.put(b'text' * 1000)
+        second = self.cache.put(b'text' * 1000)
+        self.assertEqual(first, second)
+        self.assertIn(first, self.cache)
+        self.assertEqual(self.cache.get(first), b'text' * 1000)
+        self.assertIsNone(self.cache.get('0' * 64))
+    
+    def test_least_recently_used_documents_are_evicted(self):
+        """Test that the cache stays within its size budget, evicting the oldest."""
+        self.cache.max_bytes = 2500
+        old = self.cache.put(os.urandom(1000))
+        os.utime(self.cache._path(old), (0, 0))
+        recent = self.cache.put(os.urandom(1000))
+        newest = self.cache.put(os.urandom(1000))
+        self.assertNotIn(old, self.cache)
+        self.assertIn(recent, self.cache)
+        self.assertIn(newest, self.cache)
+    
+    @patch('tgbot.data_sources.LibGostRuDataSource.afetch_document', new_callable=AsyncMock)
+    def test_document_is_fetched_once(self, mock_fetch):
+        """Test that a document is fetched from its source only once."""
+        mock_fetch.return_value = (b'%PDF-1.4', 'application/pdf', 'ГОСТ_2.105-95.pdf')
+        
+        document = get_document('ГОСТ 2.105-95', self.cache)
+        self.assertEqual(document.filename, 'ГОСТ_2.105-95.pdf')
+        self.assertEqual(read_document(document, self.cache), b'%PDF-1.4')
+        
+        remember_file_id(document, 'telegram-file-id')
+        os.remove(self.cache._path(document.sha256))
+        again = get_document('ГОСТ 2.105-95', self.cache)
+        self.assertEqual(again.file_id, 'telegram-file-id')
+        self.assertEqual(mock_fetch.call_count, 1)
+    
+    @patch('tgbot.data_sources.LibGostRuDataSource.afetch_document', new_callable=AsyncMock)
+    def test_fetched_document_is_indexed(self, mock_fetch):
+        """Test that a fetched document is indexed off the event loop."""
+        mock_fetch.return_value = ('Размеры шрифта'.encode('utf-8'), 'text/plain', 'ГОСТ_2.105-95.txt')
+        document = get_document('ГОСТ 2.105-95', self.cache)
+        self.assertEqual(self.session.query(Passage.gost_name).all(), [('ГОСТ 2.105-95',)])
+        self.assertEqual(self.session.query(Document.indexed_sha256).scalar(), document.sha256)
+    
+    def test_unknown_gost_has_no_document(self):
+        """Test that unknown GOSTs return None."""
+        self.assertIsNone(get_document('ГОСТ 0-00', self.cache))
+    
+    @patch('tgbot.bot.aget_document', new_callable=AsyncMock)
+    def test_doc_command_needs_the_designation(self, mock_get):
+        """Test that /doc does not send the document of a GOST that merely contains the text."""
+        from tgbot.bot import send_document
+        
+        self.session.add(Gost(name='ГОСТ 12.2.105-84', description='Оборудование'))
+        self.session.commit()
+        message = MagicMock(answer=AsyncMock(), answer_document=AsyncMock())
+        with patch('tgbot.parse_tools.session', self.session):
+            asyncio.run(send_document(message, CommandObject(command='doc', args='12.2.10')))
+            mock_get.assert_not_called()
+            asyncio.run(send_document(message, CommandObject(command='doc', args='ГОСТ 2.105-95')))
+        mock_get.assert_called_once_with('ГОСТ 2.105-95')
+
+
+class TestFullText(unittest.TestCase):
+    """Test passage indexing and BM25 search."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        for target in ('tgbot.fulltext.session', 'tgbot.references.session'):
+            patcher = patch(target, self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        
+        index_text('ГОСТ 16093-2004', 'Основные нормы взаимозаменяемости.\n\n'
+                   'Допуски на размеры резьбы метрической и посадки с зазором.')
+        index_text('ГОСТ 2.105-95', 'Общие требования к текстовым документам.\n\n'
+                   'Размеры шрифта и полей документа.')
+    
+    def test_tokenize_stems_and_drops_stop_words(self):
+        """Test that inflected forms map to the same term."""
+        self.assertEqual(tokenize('Допуски на размеры резьбы'),
+                         tokenize('допуск размеров резьба'))
+    
+    def test_split_passages(self):
+        """Test that long paragraphs are cut into overlapping windows."""
+        passages = split_passages(' '.join(['слово'] * 300))
+        self.assertEqual(len(passages), 3)
+        self.assertTrue(all(len(p.split()) <= 120 for p in passages))
+    
+    def test_best_passage_ranks_first(self):
+        """Test that the passage matching the requirement ranks first."""
+        hits = search_passages('допуски на размеры резьбы')
+        self.assertEqual(hits[0].gost_name, 'ГОСТ 16093-2004')
+        self.assertIn('резьбы', hits[0].text)
+        self.assertEqual(len(hits), 2)
+    
+    def test_reindexing_replaces_passages(self):
+        """Test that re-indexing a GOST replaces only its own passages."""
+        index_text('ГОСТ 16093-2004', 'Новая редакция без нужных слов.')
+        hits = search_passages('резьбы')
+        self.assertEqual(hits, [])
+        self.assertEqual(search_passages('шрифта')[0].gost_name, 'ГОСТ 2.105-95')
+    
+    def test_document_is_indexed_once_per_content(self):
+        """Test that an unchanged document is not indexed again."""
+        document = Document(gost_name='ГОСТ 1-00', sha256='abc', content_type='text/plain')
+        self.session.add(document)
+        self.session.commit()
+        self.assertEqual(index_document(document, 'Сварные швы'.encode('utf-8')), 1)
+        self.assertEqual(index_document(document, 'Сварные швы'.encode('utf-8')), 0)
+        self.assertEqual(search_passages('сварных швов')[0].gost_name, 'ГОСТ 1-00')
+    
+    @unittest.skipUnless(is_available('pdfminer', 'PIL'), 'pdfminer.six or Pillow is not installed')
+    def test_scanned_pdf_is_ocred(self):
+        """Test that a PDF without a text layer has its page images OCR'd."""
+        from PIL import Image
+        
+        scan = io.BytesIO()
+        Image.new('RGB', (200, 100), 'white').save(scan, 'PDF')
+        with patch('tgbot.parse_tools.HAS_OCR', True), \
+                patch('tgbot.parse_tools.get_gost_from_photo', return_value='Сварные швы') as mock_ocr:
+            self.assertEqual(extract_text(scan.getvalue(), 'application/pdf'), 'Сварные швы')
+        mock_ocr.assert_called_once()
+    
+    def test_document_text_only_refers(self):
+        """Test that "вместо" in a document body does not create 'replaces' edges."""
+        document = Document(gost_name='ГОСТ 1-00', sha256='abc', content_type='text/plain')
+        self.session.add(document)
+        self.session.commit()
+        index_document(document, 'Вместо ГОСТ 2-80 допускается ГОСТ 3-90.'.encode('utf-8'))
+        self.assertEqual(sorted(self.session.query(GostReference.kind, GostReference.target_norm)),
+                         [(REFERENCES, 'гост 2-80'), (REFERENCES, 'гост 3-90')])
+
+
+class TestStorage(unittest.IsolatedAsyncioTestCase):
+    """Test the pluggable FSM and cache storage."""
+    
+    async def test_memory_cache_expiry_and_lru(self):
+        """Test that the memory cache expires and evicts old entries."""
+        cache = MemoryCache(max_items=2)
+        await cache.set('a', [['ГОСТ 1', 'x']])
+        await cache.set('b', 1, ttl=-1)
+        await cache.set('c', 2)
+        self.assertIsNone(await cache.get('a'))
+        self.assertIsNone(await cache.get('b'))
+        self.assertEqual(await cache.get('c'), 2)
+    
+    def test_cache_interface_is_abstract(self):
+        """Test that a cache must implement get and set."""
+        with self.assertRaises(TypeError):
+            BaseCache()
+    
+    @unittest.skipUnless(is_available('fakeredis'), 'fakeredis is not installed')
+    async def test_replicas_share_state_through_redis(self):
+        """Test that two replicas see the same FSM state and cached results."""
+        import fakeredis
+        from aiogram.fsm.storage.base import StorageKey
+        
+        server = fakeredis.FakeServer()
+        first = fakeredis.aioredis.FakeRedis(server=server)
+        second = fakeredis.aioredis.FakeRedis(server=server)
+        
+        key = StorageKey(bot_id=1, chat_id=42, user_id=42)
+        await create_fsm_storage(first).set_state(key, 'GostStates:typing_reply')
+        self.assertEqual(await create_fsm_storage(second).get_state(key),
+                         'GostStates:typing_reply')
+        
+        await RedisCache(first).set('search:гост 2.105', [['ГОСТ 2.105-95', 'Общие']])
+        self.assertEqual(await RedisCache(second).get('search:гост 2.105'),
+                         [['ГОСТ 2.105-95', 'Общие']])
+        self.assertIsNone(await RedisCache(second).get('search:missing'))
+
+
+class TestProfiling(unittest.TestCase):
+    """Test per-source fetch profiling."""
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.profiler = profiling.FetchProfiler(output_dir=tmp.name, trace_memory=True)
+        profiling.activate(self.profiler)
+        self.addCleanup(profiling.activate, None)
+        self.output_dir = tmp.name
+    
+    def test_phases_and_counters(self):
+        """Test that a profiled fetch records phases, counters and dumps."""
+        page = '<html><div class="news"><a href="/g/1">ГОСТ 1-00</a><p>Описание</p></div></html>'
+        session = FakeClientSession(FakeResponse(page))
+        
+        with patch('tgbot.data_sources.get_client_session', return_value=session):
+            gosts = fetch_from_source(LibGostRuDataSource())
+        
+        stats = self.profiler.sources['libgost.ru']
+        self.assertEqual(len(gosts), 1)
+        self.assertEqual((stats.requests, stats.records), (1, 1))
+        self.assertEqual(stats.bytes, len(page.encode('utf-8')))
+        self.assertGreater(stats.elements, 0)
+        self.assertGreater(stats.overhead, 0)
+        self.assertGreater(stats.phases['parse'], 0)
+        self.assertAlmostEqual(sum(stats.phases.values()) + stats.overhead, stats.total, places=3)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'libgost.ru.prof')))
+        
+        report = self.profiler.report()
+        self.assertIn('libgost.ru', report)
+        self.assertIn('Slowest phases:', report)
+    
+    def test_dns_is_the_clients_own_lookup(self):
+        """Test that the client session's DNS lookup is moved from 'download' to 'dns'."""
+        from aiohttp import web
+        
+        async def page(request):
+            return web.Response(text='<html></html>')
+        
+        async def fetch():
+            app = web.Application()
+            app.router.add_get('/', page)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, 'localhost', 0).start()
+            port = runner.addresses[0][1]
+            try:
+                with profiling.profile_source('libgost.ru'):
+                    await LibGostRuDataSource().arequest(f'http://localhost:{port}/')
+            finally:
+                await runner.cleanup()
+        
+        run_sync(fetch())
+        stats = self.profiler.sources['libgost.ru']
+        self.assertGreater(stats.phases['dns'], 0)
+        self.assertGreater(stats.phases['download'], 0)
+        self.assertAlmostEqual(sum(stats.phases.values()) + stats.overhead, stats.total, places=3)
+
+
+class TestLoadTest(unittest.IsolatedAsyncioTestCase):
+    """Test the synthetic traffic load generator."""
+    
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        session.add(Gost(name='ГОСТ 2.105-95', description='Общие требования'))
+        session.commit()
+        patcher = patch('tgbot.parse_tools.session', session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def test_flows_are_replayed_through_dispatcher(self):
+        """Test that every simulated step reaches a handler and is timed."""
+        from tgbot.bot import create_dispatcher
+        
+        load_test = LoadTest(create_dispatcher(gost_index=PrefixIndex()),
+                             ['2.105'], users=4, flows=2)
+        report = await load_test.run()
+        
+        self.assertEqual(report.updates, 4 * 2 * 3)
+        # start, prompt, header and one result per conversation
+        self.assertEqual(report.calls['SendMessage'], 4 * 2 * 4)
+        self.assertGreater(report.throughput, 0)
+        summary = report.summary('query')
+        self.assertLessEqual(summary['p50'], summary['p99'])
+        self.assertIn('p99, ms', report.format())
+    
+    def test_percentile_and_zipf(self):
+        """Test nearest-rank percentiles and the skew of the query mix."""
+        self.assertEqual(percentile(list(range(1, 101)), 0.95), 95)
+        self.assertEqual(percentile([], 0.5), 0.0)
+        drawn = zipf_queries(['popular', 'rare'] + ['tail'] * 50, 2000, random.Random(1))
+        self.assertGreater(drawn.count('popular'), drawn.count('rare'))
+
+
 if __name__ == '__main__':
     unittest.main()
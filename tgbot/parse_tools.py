@@ -7,32 +7,44 @@ This module provides functions to search for GOSTs in the local database
 and from online sources.
 """
 
-from bs4 import BeautifulSoup
-import requests
+import heapq
+from typing import Optional
 
-from tgbot.models import Gost, session
+from sqlalchemy import case, column, func, or_, text
+
+from tgbot.models import GOSTS_FTS, Gost, session
 from tgbot.data_sources import (
+    afetch_from_all_sources,
     get_all_data_sources,
-    fetch_from_all_sources,
-    fetch_from_source,
+    run_sync,
 )
+from tgbot.lazy import is_available
+from tgbot.normalize import like_pattern, normalize_text
+from tgbot.search_index import PrefixIndex
+from tgbot.snapshot import Snapshot
 
 
-# Optional: OCR support for extracting GOST numbers from images
-try:
-    from PIL import Image
-    import pytesseract
-    HAS_OCR = True
-except ImportError:
-    HAS_OCR = False
+# Optional: OCR support for extracting GOST numbers from images.
+# The libraries are only imported when a photo is actually processed.
+HAS_OCR = is_available('PIL', 'pytesseract')
+
+# Relevance tiers of a match, best first
+EXACT_MATCH = 0       # the designation itself: "2.105-95" -> ГОСТ 2.105-95
+EDITION_MATCH = 1     # another edition of it: "2.105" -> ГОСТ 2.105-2019
+PREFIX_MATCH = 2      # the designation starts with the query: "2.10" -> ГОСТ 2.105
+NAME_MATCH = 3        # the query occurs somewhere in the name
+DESCRIPTION_MATCH = 4  # the query only occurs in the description
 
+# Shortest query the trigram index can answer; shorter ones scan the table
+FTS_MIN_QUERY = 3
 
-def get_gost_from_photo(photo_path: str) -> str:
+
+def get_gost_from_photo(photo_path) -> str:
     """
     Extract GOST text from an image using OCR.
     
     Args:
-        photo_path: Path to the image file.
+        photo_path: Path to the image file, or a binary file object.
         
     Returns:
         Extracted text from the image.
@@ -42,60 +54,189 @@ def get_gost_from_photo(photo_path: str) -> str:
     """
     if not HAS_OCR:
         raise ImportError("PIL and pytesseract are required for OCR functionality")
+    from PIL import Image
+    import pytesseract
     return pytesseract.image_to_string(Image.open(photo_path))
 
 
-def get_search_list_online(search_text: str) -> list:
+async def aget_search_list_online(search_text: str, limit: Optional[int] = None) -> list:
     """
     Search for GOSTs online from all available data sources.
     
+    All sources are queried concurrently on the running event loop, so
+    the bot can call this without blocking other updates.
+    
     Args:
         search_text: The search query.
+        limit: Maximum number of results, or None for all.
         
     Returns:
-        List of matching GOSTs as dictionaries with 'name' and 'description'.
+        List of matching GOSTs as dictionaries with 'name' and 'description',
+        most relevant first.
     """
-    all_gosts = fetch_from_all_sources()
+    all_gosts = await afetch_from_all_sources()
     
-    # Filter results based on search text
-    search_lower = search_text.lower()
-    results = []
+    # Filter results based on search text, best matches first
+    query = normalize_text(search_text)
+    ranked = []
     
-    for gost in all_gosts:
-        if (search_lower in gost['name'].lower() or 
-            search_lower in gost.get('description', '').lower()):
-            results.append(gost)
+    for position, gost in enumerate(all_gosts):
+        name = normalize_text(gost['name'])
+        rank = match_rank(query, name, normalize_text(gost.get('description', '')))
+        if rank is not None:
+            ranked.append((rank, len(name), position, gost))
     
-    return results
+    if limit is not None:
+        ranked = heapq.nsmallest(limit, ranked)
+    else:
+        ranked.sort()
+    return [gost for *_, gost in ranked]
+
 
+def get_search_list_online(search_text: str, limit: Optional[int] = None) -> list:
+    """Synchronous aget_search_list_online()."""
+    return run_sync(aget_search_list_online(search_text, limit))
 
-def get_search_list_db(search_text: str) -> list:
+
+def match_rank(query: str, name_norm: str, description_norm: str) -> Optional[int]:
     """
-    Search for GOSTs in the local database.
+    Relevance tier of a GOST for a query, as ranked_query() computes it in SQL.
+    
+    Args:
+        query: Normalized query.
+        name_norm: Normalized GOST name.
+        description_norm: Normalized description.
+        
+    Returns:
+        One of EXACT_MATCH ... DESCRIPTION_MATCH, or None if the GOST does
+        not match at all.
+    """
+    if query not in name_norm:
+        return DESCRIPTION_MATCH if query in description_norm else None
+    if name_norm == query or name_norm.endswith(' ' + query):
+        return EXACT_MATCH
+    if name_norm.startswith(query + '-') or f' {query}-' in name_norm:
+        return EDITION_MATCH
+    if name_norm.startswith(query) or ' ' + query in name_norm:
+        return PREFIX_MATCH
+    return NAME_MATCH
+
+
+class GostRow:
+    """
+    Lightweight read-only search result.
+    
+    Carries only the columns the search path needs and is not tracked by
+    the ORM session, so building one is much cheaper than loading a Gost.
+    """
+    
+    __slots__ = ('id', 'name', 'description')
+    
+    def __init__(self, id: int, name: str, description: str):
+        self.id = id
+        self.name = name
+        self.description = description or ''
+    
+    def __repr__(self):
+        return f"GostRow({self.id!r}, {self.name!r}, {self.description!r})"
+    
+    def __str__(self):
+        return self.name
+
+
+def fts_phrase(query: str) -> str:
+    """FTS5 phrase matching the normalized query as a substring of any column."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def ranked_query(search_text: str, *entities):
+    """
+    Build a query for GOSTs matching the search, most relevant first.
+    
+    Matches are ranked by tier (see match_rank()): the exact designation,
+    other editions of it, designations starting with the query, other name
+    matches, then description-only matches. Within a tier, shorter names
+    (or descriptions) come first, as the query covers more of them. Ranking
+    happens in ORDER BY, so a LIMIT on the query makes the database keep
+    only the top rows instead of returning every match. On SQLite the
+    matching rows are looked up in the trigram index (see models.GOSTS_FTS).
     
     Args:
         search_text: The search query.
+        *entities: Columns or mapped classes to select.
         
     Returns:
-        List of Gost objects matching the search.
+        SQLAlchemy query.
     """
-    # Search in name
-    res = session.query(Gost).filter(
-        Gost.name.like('%' + search_text + '%')
-    ).all()
+    query = normalize_text(search_text)
+    pattern = like_pattern(search_text)
+    name_match = Gost.name_norm.like(pattern)
+    matches = or_(name_match, Gost.description_norm.like(pattern))
+    rank = case([
+        (or_(Gost.name_norm == query, Gost.name_norm.like('% ' + query)), EXACT_MATCH),
+        (or_(Gost.name_norm.like(query + '-%'),
+             Gost.name_norm.like('% ' + query + '-%')), EDITION_MATCH),
+        (or_(Gost.name_norm.like(query + '%'),
+             Gost.name_norm.like('% ' + query + '%')), PREFIX_MATCH),
+        (name_match, NAME_MATCH),
+    ], else_=DESCRIPTION_MATCH)
+    matched_length = case([(name_match, func.length(Gost.name_norm))],
+                          else_=func.length(Gost.description_norm))
+    if len(query) >= FTS_MIN_QUERY and session.get_bind().dialect.name == 'sqlite':
+        # Candidates come from the trigram index instead of a table scan
+        matches = Gost.id.in_(text(
+            f'SELECT rowid FROM {GOSTS_FTS} WHERE {GOSTS_FTS} MATCH :phrase'
+        ).bindparams(phrase=fts_phrase(query)).columns(column('rowid')))
+    return session.query(*entities).filter(matches).order_by(
+        rank, matched_length, Gost.name_norm, Gost.id)
+
+
+def iter_search_rows(search_text: str, limit: Optional[int] = None,
+                     batch_size: int = 500):
+    """
+    Stream GOSTs matching the search as lightweight rows, most relevant first.
+    
+    Matching runs on the normalized shadow columns, so case, ё, dashes and
+    Latin look-alike letters in the query do not matter; the order is the
+    one of ranked_query(). Rows are fetched from the database in batches of
+    ``batch_size`` instead of being loaded all at once.
     
-    # Also search in description, avoiding duplicates
-    existing_ids = {g.id for g in res}
-    desc_results = session.query(Gost).filter(
-        Gost.description.like('%' + search_text + '%')
-    ).all()
+    Args:
+        search_text: The search query.
+        limit: Maximum number of rows to yield, or None for all.
+        batch_size: Number of rows fetched per database round trip.
+        
+    Yields:
+        GostRow instances.
+    """
+    query = ranked_query(search_text, Gost.id, Gost.name, Gost.description)
+    if limit is not None:
+        query = query.limit(limit)
+    for row in query.yield_per(batch_size):
+        yield GostRow(*row)
+
+
+def get_search_list_db(search_text: str, lean: bool = False,
+                       limit: Optional[int] = None) -> list:
+    """
+    Search for GOSTs in the local database.
     
-    for gost in desc_results:
-        if gost.id not in existing_ids:
-            res.append(gost)
-            existing_ids.add(gost.id)
+    Args:
+        search_text: The search query.
+        lean: Return lightweight GostRow records instead of ORM objects.
+        limit: Maximum number of results, or None for all.
+        
+    Returns:
+        List of Gost objects (or GostRow records if ``lean``) matching the
+        search, most relevant first.
+    """
+    if lean:
+        return list(iter_search_rows(search_text, limit=limit))
     
-    return res
+    query = ranked_query(search_text, Gost)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 
 def get_search_list(search_text: str) -> list:
@@ -109,15 +250,34 @@ def get_search_list(search_text: str) -> list:
         List of GOSTs as [name, description] pairs.
     """
     # First try database
-    db_results = get_search_list_db(search_text)
+    db_results = [[row.name, row.description]
+                  for row in iter_search_rows(search_text)]
     if db_results:
-        return [[g.name, g.description] for g in db_results]
+        return db_results
     
     # Fall back to online search
     online_results = get_search_list_online(search_text)
     return [[g['name'], g.get('description', '')] for g in online_results]
 
 
+def load_prefix_index(snapshot_path: Optional[str] = None):
+    """
+    Build the autocomplete prefix index.
+    
+    Args:
+        snapshot_path: Optional catalog snapshot written by csv_to_sql.py.
+            When given, the snapshot is memory-mapped instead of reading
+            the database.
+    
+    Returns:
+        PrefixIndex over all GOSTs in the database, or a Snapshot.
+    """
+    if snapshot_path:
+        return Snapshot(snapshot_path)
+    rows = session.query(Gost.name, Gost.description)
+    return PrefixIndex(rows)
+
+
 def list_available_sources() -> list:
     """
     Get a list of all available GOST data sources.
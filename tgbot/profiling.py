@@ -0,0 +1,239 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Per-source fetch profiling for the database update script.
+
+When a profiler is active, every data source fetch is split into phases:
+
+    dns       the HTTP client's own host name lookups (see dns_trace_config)
+    download  HTTP requests, including the response body, minus DNS
+    decode    turning response bytes into text
+    parse     building the BeautifulSoup / lxml tree
+    extract   everything else, mostly the find_all loops in fetch_gosts
+
+Bytes downloaded and elements parsed are counted as well (the time spent
+counting elements is kept out of the phases), and cProfile and
+tracemalloc snapshots can be captured per source. Without an active
+profiler the hooks cost a single global lookup. Phases are wall time, so
+concurrent requests of one source add up to more than the fetch took.
+"""
+
+from contextlib import contextmanager, nullcontext
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+PHASES = ('dns', 'download', 'decode', 'parse', 'extract')
+
+
+class SourceStats:
+    """Timings and counters collected for one data source."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.total = 0.0
+        self.requests = 0
+        self.bytes = 0
+        self.elements = 0
+        self.records = 0
+        self.peak_memory = 0
+        # Time spent counting elements, left out of the phases
+        self.overhead = 0.0
+
+
+class FetchProfiler:
+    """
+    Collects per-source, per-phase fetch statistics.
+
+    Args:
+        output_dir: If given, a cProfile dump (<source>.prof) is written
+            there for every source.
+        trace_memory: Record the peak memory allocated while fetching each
+            source with tracemalloc (and dump a snapshot if output_dir is set).
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, trace_memory: bool = False):
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.sources: Dict[str, SourceStats] = {}
+        self._lock = threading.Lock()
+
+    def stats(self, source: str) -> SourceStats:
+        with self._lock:
+            if source not in self.sources:
+                self.sources[source] = SourceStats(source)
+            return self.sources[source]
+
+    @contextmanager
+    def phase(self, source: str, phase: str):
+        """Time one phase of a source's fetch."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.stats(source)
+            with self._lock:
+                stats.phases[phase] += elapsed
+
+    def record_dns(self, source: str, seconds: float):
+        """Move a DNS lookup made during a download from 'download' to 'dns'."""
+        stats = self.stats(source)
+        with self._lock:
+            stats.phases['dns'] += seconds
+            stats.phases['download'] -= seconds
+
+    def count(self, source: str, requests: int = 0, bytes: int = 0,
+              elements: int = 0, records: int = 0):
+        """Add to a source's counters."""
+        stats = self.stats(source)
+        with self._lock:
+            stats.requests += requests
+            stats.bytes += bytes
+            stats.elements += elements
+            stats.records += records
+
+    def count_elements(self, source: str, soup):
+        """Count the elements of a parsed page, without timing it as a phase."""
+        start = time.perf_counter()
+        elements = len(soup.find_all(True))
+        elapsed = time.perf_counter() - start
+        stats = self.stats(source)
+        with self._lock:
+            stats.elements += elements
+            stats.overhead += elapsed
+
+    @contextmanager
+    def profile_source(self, source: str):
+        """Profile a whole fetch; time not spent in other phases is 'extract'."""
+        stats = self.stats(source)
+        profile = cProfile.Profile() if self.output_dir else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profile:
+            profile.enable()
+
+        start = time.perf_counter()
+        before = sum(stats.phases.values()) + stats.overhead
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile:
+                profile.disable()
+            with self._lock:
+                accounted = sum(stats.phases.values()) + stats.overhead - before
+                stats.phases['extract'] += max(elapsed - accounted, 0.0)
+                stats.total += elapsed
+            if self.trace_memory:
+                stats.peak_memory = max(stats.peak_memory, tracemalloc.get_traced_memory()[1])
+            self._dump(source, profile)
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _dump(self, source: str, profile: Optional[cProfile.Profile]):
+        if not self.output_dir:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = re.sub(r'[^\w.-]+', '_', source)
+        if profile:
+            profile.dump_stats(os.path.join(self.output_dir, filename + '.prof'))
+        if self.trace_memory:
+            tracemalloc.take_snapshot().dump(
+                os.path.join(self.output_dir, filename + '.tracemalloc'))
+
+    def slowest_phases(self, limit: int = 10) -> list:
+        """Return (seconds, source, phase) tuples, slowest first."""
+        phases = [(seconds, stats.name, phase)
+                  for stats in self.sources.values()
+                  for phase, seconds in stats.phases.items() if seconds > 0]
+        return sorted(phases, reverse=True)[:limit]
+
+    def report(self, limit: int = 10) -> str:
+        """Build a ranked report of the slowest sources and phases."""
+        lines = ['Slowest sources:',
+                 f"  {'source':<22}{'total, s':>10}" +
+                 ''.join(f"{phase + ', s':>12}" for phase in PHASES) +
+                 f"{'requests':>10}{'KiB':>10}{'elements':>10}{'records':>9}" +
+                 (f"{'peak MiB':>10}" if self.trace_memory else '')]
+        ranked = sorted(self.sources.values(), key=lambda stats: stats.total, reverse=True)
+        for stats in ranked:
+            line = (f"  {stats.name:<22}{stats.total:>10.3f}" +
+                    ''.join(f"{stats.phases[phase]:>12.3f}" for phase in PHASES) +
+                    f"{stats.requests:>10}{stats.bytes / 1024:>10.1f}"
+                    f"{stats.elements:>10}{stats.records:>9}")
+            if self.trace_memory:
+                line += f"{stats.peak_memory / 2 ** 20:>10.1f}"
+            lines.append(line)
+
+        lines.append('')
+        lines.append('Slowest phases:')
+        for seconds, source, phase in self.slowest_phases(limit):
+            lines.append(f"  {seconds:>8.3f} s  {source} / {phase}")
+        if self.output_dir:
+            lines.append('')
+            lines.append(f"cProfile/tracemalloc dumps written to {self.output_dir}")
+        return '\n'.join(lines)
+
+
+_active: Optional[FetchProfiler] = None
+
+
+def activate(profiler: Optional[FetchProfiler]):
+    """Install (or, with None, remove) the process-wide profiler."""
+    global _active
+    _active = profiler
+
+
+def get_active() -> Optional[FetchProfiler]:
+    """Return the active profiler, if profiling is enabled."""
+    return _active
+
+
+def phase(source: str, name: str):
+    """Context manager timing a phase, a no-op when profiling is off."""
+    if _active is None:
+        return nullcontext()
+    return _active.phase(source, name)
+
+
+def dns_trace_config():
+    """
+    Create an aiohttp TraceConfig reporting the client's DNS lookups.
+
+    Lookups of requests whose trace_request_ctx names a source ({'source':
+    name}) are recorded by the active profiler; without one they cost only
+    the callbacks. Cached lookups are not reported by aiohttp.
+
+    Returns:
+        aiohttp.TraceConfig for the client session.
+    """
+    import aiohttp
+
+    async def on_start(session, context, params):
+        context.dns_started = time.perf_counter()
+
+    async def on_end(session, context, params):
+        if _active is not None and context.trace_request_ctx:
+            _active.record_dns(context.trace_request_ctx['source'],
+                               time.perf_counter() - context.dns_started)
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(on_start)
+    config.on_dns_resolvehost_end.append(on_end)
+    return config
+
+
+def profile_source(source: str):
+    """Context manager profiling a whole source fetch, a no-op when off."""
+    if _active is None:
+        return nullcontext()
+    return _active.profile_source(source)
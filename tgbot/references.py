@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Cross-reference graph of standards.
+
+Descriptions name the standards a GOST replaces ("Взамен ГОСТ 2.105-79")
+and, like documents, the ones it refers to. At ingest these mentions are
+extracted into gost_references, an adjacency list indexed in both
+directions, so "what does it replace / refer to" and "what replaced /
+refers to it" are single index lookups. Supersession chains can be many
+editions deep; their transitive closure is computed once, by a
+breadth-first search from every GOST, into gost_supersessions and rebuilt
+whenever the edges change.
+"""
+
+from collections import defaultdict
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import func
+
+from tgbot.models import BATCH_SIZE, Gost, GostReference, GostSupersession, chunks, session
+from tgbot.normalize import normalize_text
+
+REPLACES = 'replaces'
+REFERENCES = 'references'
+
+# Where an edge was found
+DESCRIPTION = 'description'
+DOCUMENT = 'document'
+
+# Series between "ГОСТ" and the number: ГОСТ Р, ГОСТ Р ИСО, ГОСТ ISO/IEC, ...
+_SERIES = sorted({normalize_text(series) for series in (
+    'Р', 'ИСО', 'ISO', 'МЭК', 'IEC', 'ЕН', 'EN', 'ТС', 'TS',
+)}, key=len, reverse=True)
+_SERIES_RE = '(?:{0})(?:/(?:{0}))*'.format('|'.join(map(re.escape, _SERIES)))
+# Designations as they appear in normalized text, e.g. "гост р исо 9001-2015"
+DESIGNATION_RE = re.compile(
+    r'(?<!\w)гост(?: ' + _SERIES_RE + r')* \d+(?:\.\d+)*(?:-\d{2,4})?(?!\w)'
+)
+# Introduces the standards the text's GOST replaces
+_REPLACES_RE = re.compile(r'(?<!\w)(?:взамен|заменяет|вместо)$')
+# Allowed between the designations of one "взамен" list
+_LIST_GAP_RE = re.compile(r'^ ?(?:и )?$')
+
+
+def extract_references(text: str) -> List[Tuple[str, str]]:
+    """
+    Find the standards a text replaces or refers to.
+
+    Args:
+        text: Description or document text, in any spelling
+            normalize_text() folds.
+
+    Returns:
+        (kind, normalized designation) pairs in order of appearance, each
+        designation once; REPLACES wins over REFERENCES.
+    """
+    text = normalize_text(text)
+    kinds: Dict[str, str] = {}
+    in_list = False
+    end = 0
+    for match in DESIGNATION_RE.finditer(text):
+        gap = text[end:match.start()]
+        if _REPLACES_RE.search(gap.rstrip()):
+            in_list = True
+        elif not _LIST_GAP_RE.match(gap):
+            in_list = False
+        kind = REPLACES if in_list else REFERENCES
+        designation = match.group()
+        if kinds.get(designation) != REPLACES:
+            kinds[designation] = kind
+        end = match.end()
+    return list((kind, designation) for designation, kind in kinds.items())
+
+
+def record_references(entries: Iterable[Dict[str, str]], origin: str = DESCRIPTION) -> int:
+    """
+    Replace the edges extracted from the given texts of some GOSTs.
+
+    Args:
+        entries: Dictionaries with 'name_norm', 'name' and 'description'
+            (the text to extract from) of new or changed GOSTs.
+        origin: DESCRIPTION or DOCUMENT, the kind of text in the entries.
+            Document text only yields 'references' edges: its body says
+            "вместо ГОСТ X допускается ГОСТ Y" as well, so "взамен" is
+            only trusted in descriptions.
+
+    Returns:
+        Number of edges recorded.
+    """
+    count = 0
+    for chunk in chunks(list(entries)):
+        session.query(GostReference).filter(
+            GostReference.source_norm.in_([entry['name_norm'] for entry in chunk]),
+            GostReference.origin == origin,
+        ).delete(synchronize_session=False)
+        edges = []
+        seen: Set[str] = set()
+        for entry in chunk:
+            source_norm = entry['name_norm']
+            if source_norm in seen:
+                continue
+            seen.add(source_norm)
+            for kind, target_norm in extract_references(entry.get('description')):
+                if target_norm == source_norm:
+                    continue
+                if origin != DESCRIPTION:
+                    kind = REFERENCES
+                edges.append({
+                    'source_norm': source_norm, 'source_name': entry['name'],
+                    # Replaced by the catalog name below if the target is known
+                    'target_norm': target_norm, 'target_name': target_norm.upper(),
+                    'kind': kind, 'origin': origin,
+                })
+        names = _catalog_names({edge['target_norm'] for edge in edges})
+        for edge in edges:
+            edge['target_name'] = names.get(edge['target_norm'], edge['target_name'])
+        session.bulk_insert_mappings(GostReference, edges)
+        count += len(edges)
+    return count
+
+
+def _catalog_names(name_norms: Set[str]) -> Dict[str, str]:
+    """Names of the designations that are in the catalog, as stored there."""
+    names = {}
+    for chunk in chunks(sorted(name_norms)):
+        names.update(session.query(Gost.name_norm, Gost.name).filter(
+            Gost.name_norm.in_(chunk)))
+    return names
+
+
+def remove_references(name_norms: Iterable[str]):
+    """Delete the outgoing edges of GOSTs removed from the catalog."""
+    for chunk in chunks(list(name_norms)):
+        session.query(GostReference).filter(
+            GostReference.source_norm.in_(chunk)
+        ).delete(synchronize_session=False)
+
+
+def rebuild_references() -> int:
+    """
+    Re-extract the edges of every GOST's description and rebuild the closure.
+
+    Needed once for catalogs stored before the graph existed; afterwards
+    ingest keeps it up to date.
+
+    Returns:
+        Number of edges recorded.
+    """
+    rows = session.query(Gost.name_norm, Gost.name, Gost.description).all()
+    count = record_references(
+        {'name_norm': name_norm, 'name': name, 'description': description}
+        for name_norm, name, description in rows
+    )
+    rebuild_closure()
+    session.commit()
+    return count
+
+
+def rebuild_closure() -> int:
+    """
+    Recompute the supersession closure from the descriptions' 'replaces' edges.
+
+    Every GOST is searched breadth-first with its own visited set, so each
+    (newer, older) pair is reached once, at its shortest depth, and cycles
+    in (bad) source data end the search instead of repeating it.
+
+    Returns:
+        Number of (newer, older) pairs in the closure.
+    """
+    older: Dict[str, List[str]] = defaultdict(list)
+    newer_names: Dict[str, str] = {}
+    older_names: Dict[str, str] = {}
+    for source_norm, source_name, target_norm, target_name in session.query(
+            GostReference.source_norm, GostReference.source_name,
+            GostReference.target_norm, GostReference.target_name,
+    ).filter(
+        GostReference.kind == REPLACES,
+        GostReference.origin == DESCRIPTION,
+    ).distinct():
+        older[source_norm].append(target_norm)
+        newer_names[source_norm] = min(source_name, newer_names.get(source_norm, source_name))
+        older_names[target_norm] = min(target_name, older_names.get(target_norm, target_name))
+
+    closure = GostSupersession.__table__
+    session.execute(closure.delete())
+    rows = []
+    for newer_norm in sorted(older):
+        visited = {newer_norm}
+        level = [newer_norm]
+        depth = 0
+        while level:
+            depth += 1
+            next_level = []
+            for norm in level:
+                for older_norm in older.get(norm, ()):
+                    if older_norm not in visited:
+                        visited.add(older_norm)
+                        next_level.append(older_norm)
+                        rows.append({
+                            'newer_norm': newer_norm, 'newer_name': newer_names[newer_norm],
+                            'older_norm': older_norm, 'older_name': older_names[older_norm],
+                            'depth': depth,
+                        })
+            level = next_level
+        if len(rows) >= BATCH_SIZE:
+            session.execute(closure.insert(), rows)
+            rows = []
+    if rows:
+        session.execute(closure.insert(), rows)
+    return session.query(func.count(GostSupersession.id)).scalar()
+
+
+def references_of(name: str) -> List[str]:
+    """Designations of the standards a GOST refers to."""
+    return [target for target, in session.query(GostReference.target_name).filter(
+        GostReference.source_norm == normalize_text(name),
+        GostReference.kind == REFERENCES,
+    ).distinct().order_by(GostReference.target_name)]
+
+
+def referenced_by(name: str) -> List[str]:
+    """Names of the GOSTs that refer to a standard."""
+    return [source for source, in session.query(GostReference.source_name).filter(
+        GostReference.target_norm == normalize_text(name),
+        GostReference.kind == REFERENCES,
+    ).distinct().order_by(GostReference.source_name)]
+
+
+def replaces(name: str) -> List[Tuple[str, int]]:
+    """
+    Get every earlier edition a GOST replaces, directly or down a chain.
+
+    Args:
+        name: GOST name, in any spelling normalize_text() folds.
+
+    Returns:
+        (designation, depth) pairs, the directly replaced standards
+        (depth 1) first.
+    """
+    return session.query(GostSupersession.older_name, GostSupersession.depth).filter(
+        GostSupersession.newer_norm == normalize_text(name)
+    ).order_by(GostSupersession.depth, GostSupersession.older_name).all()
+
+
+def replaced_by(name: str) -> List[Tuple[str, int]]:
+    """
+    Get every later standard that replaces a GOST, directly or up a chain.
+
+    Args:
+        name: GOST name, in any spelling normalize_text() folds.
+
+    Returns:
+        (name, depth) pairs, the direct replacements (depth 1) first.
+    """
+    return session.query(GostSupersession.newer_name, GostSupersession.depth).filter(
+        GostSupersession.older_norm == normalize_text(name)
+    ).order_by(GostSupersession.depth, GostSupersession.newer_name).all()
@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Offline regression and throughput suite for the data source parsers.
+
+tgbot/fixtures holds pages and files for every built-in source, and
+fixtures/manifest.json maps each request a source makes to one of them,
+together with the number of GOSTs its parser must find there. A local
+HTTP server replays the corpus; the sources are pointed at it through
+their base_url setting, so the real request, decoding and parsing code
+runs without network access. A parser that silently returns too few rows
+fails the check, and every run reports records per second.
+
+The corpus is synthetic: the pages were written against the selectors
+each parser uses, not recorded from the live sites. It guards the parsers
+against regressions and measures their throughput, but does not prove
+they still match the sites' current markup. Recorded responses can be
+dropped in under the same routes.
+
+Usage:
+    python -m tgbot.replay [--iterations N] [--source NAME]
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+from tgbot.data_sources import DATA_SOURCE_CLASSES, run_sync
+from tgbot.source_config import SourceConfig
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MANIFEST = 'manifest.json'
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    # gost.ru publishes its open data in CP1251
+    '.csv': 'text/csv; charset=windows-1251',
+}
+
+
+def load_manifest(fixtures_dir: str = FIXTURES_DIR) -> Dict[str, Dict]:
+    """Read the routes and expected record counts of the fixture sources."""
+    with open(os.path.join(fixtures_dir, MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def route_key(path: str, query: str = '') -> str:
+    """Canonical form of a request path and query, independent of encoding and order."""
+    key = unquote(path)
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    if params:
+        key += '?' + urlencode(params)
+    return key
+
+
+class ReplayServer:
+    """
+    HTTP server answering the sources' requests from the fixture corpus.
+
+    Every source is mounted under its own path prefix, so one server
+    replays all of them; unknown requests get a 404.
+
+    Args:
+        fixtures_dir: Directory with manifest.json and one subdirectory
+            of fixture files per source.
+    """
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        self.manifest = load_manifest(fixtures_dir)
+        self.routes = {}
+        for source, entry in self.manifest.items():
+            for route, filename in entry['routes'].items():
+                path, _, query = route.partition('?')
+                self.routes[route_key(f'/{source}{path}', query)] = os.path.join(
+                    fixtures_dir, source, filename)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'ReplayServer':
+        """Start serving on a free localhost port in a background thread."""
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                filename = replay.routes.get(route_key(url.path, url.query))
+                if filename is None:
+                    self.send_error(404)
+                    return
+                with open(filename, 'rb') as f:
+                    body = f.read()
+                content_type = CONTENT_TYPES.get(os.path.splitext(filename)[1],
+                                                 'application/octet-stream')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+    def base_url(self, source: str) -> str:
+        """Base URL replaying a source's fixture pages."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/{source}'
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ParserResult:
+    """Record count and throughput of one source's parser over the corpus."""
+
+    __slots__ = ('source', 'expected', 'records', 'timings')
+
+    def __init__(self, source: str, expected: int, records: int, timings: List[float]):
+        self.source = source
+        self.expected = expected
+        self.records = records
+        self.timings = timings
+
+    @property
+    def ok(self) -> bool:
+        return self.records == self.expected
+
+    @property
+    def best(self) -> float:
+        """Fastest fetch, in seconds."""
+        return min(self.timings)
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.best if self.best else 0.0
+
+
+def replay_source(server: ReplayServer, source_class, iterations: int = 1) -> ParserResult:
+    """
+    Fetch one source from the replay server.
+
+    Args:
+        server: Running replay server.
+        source_class: GostDataSource subclass with fixtures.
+        iterations: Number of fetches to time.
+
+    Returns:
+        The parser's result; the record count is the one of the last fetch.
+    """
+    name = source_class.name
+    source = source_class(SourceConfig(base_url=server.base_url(name)))
+    timings = []
+    gosts = []
+    for _ in range(max(1, iterations)):
+        start = time.perf_counter()
+        gosts = run_sync(source.afetch_gosts())
+        timings.append(time.perf_counter() - start)
+    return ParserResult(name, server.manifest[name]['expected'], len(gosts), timings)
+
+
+def replay_all(iterations: int = 1, sources: Optional[List[str]] = None,
+               fixtures_dir: str = FIXTURES_DIR) -> List[ParserResult]:
+    """
+    Replay the corpus through every built-in source that has fixtures.
+
+    Args:
+        iterations: Fetches timed per source.
+        sources: Names of the sources to replay, or None for all.
+        fixtures_dir: Fixture corpus to serve.
+
+    Returns:
+        One result per source, in DATA_SOURCE_CLASSES order.
+    """
+    with ReplayServer(fixtures_dir) as server:
+        return [
+            replay_source(server, source_class, iterations)
+            for source_class in DATA_SOURCE_CLASSES
+            if source_class.name in server.manifest
+            and (sources is None or source_class.name in sources)
+        ]
+
+
+def format_results(results: List[ParserResult]) -> str:
+    lines = [f"  {'source':<20}{'expected':>10}{'records':>10}{'best, ms':>10}{'records/s':>12}"]
+    for result in results:
+        lines.append(f"  {result.source:<20}{result.expected:>10}{result.records:>10}"
+                     f"{result.best * 1000:>10.1f}{result.records_per_second:>12.0f}"
+                     + ('' if result.ok else '  FAIL'))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the fixture source pages through the parsers.')
+    parser.add_argument('--iterations', type=int, default=5, help='Fetches timed per source')
+    parser.add_argument('--source', action='append', dest='sources',
+                        help='Only replay this source (repeatable)')
+    args = parser.parse_args()
+
+    results = replay_all(args.iterations, args.sources)
+    print(format_results(results))
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+In-memory prefix index over GOST designations.
+
+The index is a sorted array of normalized keys searched with bisect.
+It backs inline-mode autocomplete, where every keystroke has to be
+answered within a few milliseconds.
+"""
+
+from bisect import bisect_left
+from typing import Iterable, List, Tuple
+
+from tgbot.normalize import normalize_text, designation_number
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over normalized GOST names.
+
+    Every GOST is indexed under its full normalized name ("гост р 52857-2007")
+    and under its bare number ("52857-2007"), so both forms autocomplete.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        """
+        Build the index.
+
+        Args:
+            entries: Iterable of (name, description) pairs.
+        """
+        self._entries: List[Tuple[str, str]] = []
+        keyed = []
+        for name, description in entries:
+            if not name:
+                continue
+            entry_id = len(self._entries)
+            self._entries.append((name, description or ''))
+            key = normalize_text(name)
+            keyed.append((key, entry_id))
+            number = designation_number(key)
+            if number and number != key:
+                keyed.append((number, entry_id))
+        keyed.sort()
+        self._keys = [key for key, _ in keyed]
+        self._ids = [entry_id for _, entry_id in keyed]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def search(self, prefix: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        Find GOSTs whose name or number starts with the given prefix.
+
+        Args:
+            prefix: The (raw) text typed by the user.
+            limit: Maximum number of results to return.
+
+        Returns:
+            List of (name, description) pairs in key order.
+        """
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        keys = self._keys
+        pos = bisect_left(keys, prefix)
+        while pos < len(keys) and len(results) < limit:
+            if not keys[pos].startswith(prefix):
+                break
+            entry_id = self._ids[pos]
+            if entry_id not in seen:
+                seen.add(entry_id)
+                results.append(self._entries[entry_id])
+            pos += 1
+        return results
@@ -0,0 +1,226 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Compact binary snapshot of the GOST catalog for read-only search replicas.
+
+The snapshot is written once by csv_to_sql.py and memory-mapped by every
+bot process, so all replicas share a single page-cached copy and start
+without touching the database.
+
+File layout (native byte order, checked on open):
+
+    header        magic, version, normalizer version, byte order, record
+                  count, section offsets
+    offsets       uint64[FIELD_COUNT * count + 1], start of every string
+    blob          UTF-8 strings, FIELD_COUNT per record, back to back
+    name index    uint32[count], record ids sorted by normalized name
+    number index  uint32[count], record ids sorted by bare designation number
+"""
+
+from array import array
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import sys
+from typing import Iterable, List, Tuple
+
+from tgbot.normalize import NORMALIZER_VERSION, normalize_text, designation_number
+
+
+MAGIC = b'GOSTSNAP'
+VERSION = 2
+
+# magic, version, normalizer version, little-endian flag, count,
+# offsets/blob/name/number positions
+_HEADER = struct.Struct('=8sIIIQQQQQ')
+
+NAME, DESCRIPTION, NAME_KEY, NUMBER_KEY = range(4)
+FIELD_COUNT = 4
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is truncated or incompatible."""
+
+
+def _pad(size: int, alignment: int = 8) -> int:
+    return -size % alignment
+
+
+def write_snapshot(rows: Iterable[Tuple[str, str]], path: str) -> int:
+    """
+    Write a catalog snapshot.
+
+    The file is written next to its destination and then renamed over it,
+    so processes that already mapped the old snapshot keep a consistent view.
+
+    Args:
+        rows: Iterable of (name, description) pairs.
+        path: Destination file path.
+
+    Returns:
+        Number of records written.
+    """
+    offsets = array('Q', [0])
+    blob = bytearray()
+    name_keys = []
+    number_keys = []
+
+    for name, description in rows:
+        if not name:
+            continue
+        name_key = normalize_text(name)
+        number_key = designation_number(name_key)
+        for value in (name, description or '', name_key, number_key):
+            blob += value.encode('utf-8')
+            offsets.append(len(blob))
+        name_keys.append(name_key)
+        number_keys.append(number_key)
+
+    count = len(name_keys)
+    name_index = array('I', sorted(range(count), key=name_keys.__getitem__))
+    number_index = array('I', sorted(range(count), key=number_keys.__getitem__))
+
+    offsets_pos = _HEADER.size + _pad(_HEADER.size)
+    blob_pos = offsets_pos + len(offsets) * offsets.itemsize
+    name_pos = blob_pos + len(blob) + _pad(len(blob))
+    number_pos = name_pos + len(name_index) * name_index.itemsize
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, NORMALIZER_VERSION, sys.byteorder == 'little',
+                             count, offsets_pos, blob_pos, name_pos, number_pos))
+        f.write(b'\0' * _pad(_HEADER.size))
+        offsets.tofile(f)
+        f.write(blob)
+        f.write(b'\0' * _pad(len(blob)))
+        name_index.tofile(f)
+        number_index.tofile(f)
+    os.replace(tmp_path, path)
+    return count
+
+
+class _SortedKeys:
+    """Lazy sequence view of one index, decoding keys only when bisect asks."""
+
+    def __init__(self, snapshot: 'Snapshot', index: memoryview, field: int):
+        self._snapshot = snapshot
+        self._index = index
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, pos: int) -> str:
+        return self._snapshot.field(self._index[pos], self._field)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a catalog snapshot.
+
+    Strings are decoded on access straight from the mapped pages; nothing
+    is copied into Python objects up front. Implements the same ``search``
+    interface as PrefixIndex, so it can back inline autocomplete directly.
+    """
+
+    def __init__(self, path: str):
+        self._views = []
+        self._mmap = None
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise SnapshotError(f"Cannot map snapshot {path}: {e}")
+
+        buf = self._view(memoryview(self._mmap))
+        if len(buf) < _HEADER.size:
+            self.close()
+            raise SnapshotError(f"Snapshot {path} is truncated")
+        (magic, version, normalizer, little, count, offsets_pos, blob_pos,
+         name_pos, number_pos) = _HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise SnapshotError(f"{path} is not a version {VERSION} GOST snapshot")
+        if normalizer != NORMALIZER_VERSION:
+            # Its name and number keys would not match today's normalized queries
+            self.close()
+            raise SnapshotError(f"Snapshot {path} was written by another normalizer "
+                                "version, export it again")
+        if bool(little) != (sys.byteorder == 'little'):
+            self.close()
+            raise SnapshotError(f"Snapshot {path} was written with a different byte order")
+
+        self._count = count
+        self._offsets = self._view(buf[offsets_pos:blob_pos].cast('Q'))
+        self._blob = self._view(buf[blob_pos:blob_pos + self._offsets[-1]])
+        self._name_index = self._view(buf[name_pos:number_pos].cast('I'))
+        self._number_index = self._view(
+            buf[number_pos:number_pos + 4 * count].cast('I'))
+
+    def _view(self, view: memoryview) -> memoryview:
+        # Every exported view must be released before the map can be closed
+        self._views.append(view)
+        return view
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memory views and unmap the file."""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mmap is not None and not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def field(self, record: int, field: int) -> str:
+        """Decode one string field of a record."""
+        pos = record * FIELD_COUNT + field
+        return str(self._blob[self._offsets[pos]:self._offsets[pos + 1]], 'utf-8')
+
+    def get(self, record: int) -> Tuple[str, str]:
+        """Return the (name, description) pair of a record."""
+        return self.field(record, NAME), self.field(record, DESCRIPTION)
+
+    def _prefix_scan(self, index: memoryview, field: int, prefix: str):
+        keys = _SortedKeys(self, index, field)
+        pos = bisect_left(keys, prefix)
+        while pos < len(keys) and keys[pos].startswith(prefix):
+            yield index[pos]
+            pos += 1
+
+    def search(self, prefix: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        Find GOSTs whose name or bare number starts with the given prefix.
+
+        Args:
+            prefix: The (raw) text typed by the user.
+            limit: Maximum number of results to return.
+
+        Returns:
+            List of (name, description) pairs, name matches first.
+        """
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        for index, field in ((self._name_index, NAME_KEY),
+                             (self._number_index, NUMBER_KEY)):
+            for record in self._prefix_scan(index, field, prefix):
+                if len(results) >= limit:
+                    return results
+                if record not in seen:
+                    seen.add(record)
+                    results.append(self.get(record))
+        return results
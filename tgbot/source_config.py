@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Per-source configuration for GOST data sources.
+
+Sources can be throttled, re-prioritized or switched off in production
+without a code change, through a JSON file such as:
+
+    {
+        "defaults": {"timeout": 30},
+        "sources": {
+            "protect.gost.ru": {"enabled": false},
+            "docs.cntd.ru": {"rate_limit": 2, "concurrency": 4, "priority": 10}
+        },
+        "plugins": ["mypackage.sources:MySource"]
+    }
+
+The file is taken from the GOSTBOT_SOURCES_CONFIG environment variable
+unless a path is given explicitly.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+
+CONFIG_ENV_VAR = 'GOSTBOT_SOURCES_CONFIG'
+
+
+class SourceConfigError(ValueError):
+    """Raised when a source configuration file is invalid."""
+
+
+class SourceConfig:
+    """
+    Runtime settings of one data source.
+
+    Attributes:
+        enabled: Whether the source takes part in refreshes.
+        concurrency: Maximum number of simultaneous requests to the source.
+        rate_limit: Maximum requests per second, or None for unlimited.
+        timeout: Request timeout in seconds, or None for the source default.
+        priority: Sources with higher priority are fetched first and win
+            when several sources return the same GOST.
+        base_url: Optional override of the source's base URL.
+    """
+
+    FIELDS = ('enabled', 'concurrency', 'rate_limit', 'timeout', 'priority', 'base_url')
+
+    def __init__(self, enabled: bool = True, concurrency: int = 1,
+                 rate_limit: Optional[float] = None, timeout: Optional[float] = None,
+                 priority: int = 0, base_url: Optional[str] = None):
+        if concurrency < 1:
+            raise SourceConfigError(f"concurrency must be at least 1, got {concurrency}")
+        if rate_limit is not None and rate_limit <= 0:
+            raise SourceConfigError(f"rate_limit must be positive, got {rate_limit}")
+        if timeout is not None and timeout <= 0:
+            raise SourceConfigError(f"timeout must be positive, got {timeout}")
+        self.enabled = enabled
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        self.priority = priority
+        self.base_url = base_url
+
+    @classmethod
+    def from_dict(cls, data: Dict, defaults: Optional[Dict] = None) -> 'SourceConfig':
+        """Build a config from a mapping, on top of optional defaults."""
+        merged = dict(defaults or {})
+        merged.update(data)
+        unknown = set(merged) - set(cls.FIELDS)
+        if unknown:
+            raise SourceConfigError(f"Unknown source settings: {', '.join(sorted(unknown))}")
+        try:
+            return cls(**merged)
+        except TypeError as e:
+            raise SourceConfigError(str(e))
+
+    def __repr__(self):
+        settings = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+        return f"SourceConfig({settings})"
+
+
+class SourcesConfig:
+    """Configuration of all data sources, as loaded from a config file."""
+
+    def __init__(self, sources: Optional[Dict[str, SourceConfig]] = None,
+                 defaults: Optional[Dict] = None, plugins: Optional[List[str]] = None):
+        self.sources = sources or {}
+        self.defaults = defaults or {}
+        self.plugins = plugins or []
+
+    def for_source(self, name: str) -> SourceConfig:
+        """Get the settings of a source, falling back to the defaults."""
+        if name in self.sources:
+            return self.sources[name]
+        return SourceConfig.from_dict({}, self.defaults)
+
+
+def load_sources_config(path: Optional[str] = None) -> SourcesConfig:
+    """
+    Load the data source configuration.
+
+    Args:
+        path: JSON config file. Defaults to $GOSTBOT_SOURCES_CONFIG; if
+            neither is set, every source runs with default settings.
+
+    Returns:
+        The parsed configuration.
+
+    Raises:
+        SourceConfigError: If the file is not valid JSON or has bad settings.
+    """
+    path = path or os.environ.get(CONFIG_ENV_VAR)
+    if not path:
+        return SourcesConfig()
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise SourceConfigError(f"Cannot read source config {path}: {e}")
+
+    defaults = data.get('defaults', {})
+    sources = {
+        name: SourceConfig.from_dict(settings, defaults)
+        for name, settings in data.get('sources', {}).items()
+    }
+    return SourcesConfig(sources, defaults, data.get('plugins', []))
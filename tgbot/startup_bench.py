@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Startup-time benchmark for the bot and the database update CLI.
+
+Every scenario runs in a fresh interpreter, so the numbers are true cold
+starts (apart from the OS page cache). aiogram's own import time is measured
+separately and subtracted from the bot figure, since it is outside our control.
+
+Usage:
+    python -m tgbot.startup_bench [--runs N] [--budget SECONDS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+
+SCENARIOS = [
+    ('import parse_tools', ['-c', 'import tgbot.parse_tools']),
+    ('csv_to_sql --list-sources', ['-m', 'tgbot.csv_to_sql', '--list-sources']),
+    ('import bot', ['-c', 'import tgbot.bot']),
+]
+AIOGRAM_BASELINE = ['-c', 'import aiogram, aiogram.types']
+
+# Modules that must not be loaded just to answer database searches
+HEAVY_MODULES = ('aiohttp', 'bs4', 'lxml.html', 'PIL', 'pytesseract')
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    return env
+
+
+def _run(args, cwd: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=cwd, env=_env(), check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure(args, runs: int = 5) -> float:
+    """
+    Measure the median wall time of starting Python with the given arguments.
+
+    Args:
+        args: Interpreter arguments, e.g. ['-c', 'import tgbot.bot'].
+        runs: Number of fresh interpreters to start.
+
+    Returns:
+        Median wall time in seconds.
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        _run(args, cwd)  # warm the OS cache and write .pyc files
+        return statistics.median(_run(args, cwd) for _ in range(runs))
+
+
+def loaded_heavy_modules(module: str, args: Optional[List[str]] = None) -> list:
+    """
+    Return the heavy dependencies that get executed by importing a module.
+
+    Args:
+        module: Module name, e.g. 'tgbot.parse_tools'.
+        args: If given, the module is run as a script with these arguments
+            (like python -m) instead of being imported.
+
+    Returns:
+        Names from HEAVY_MODULES that were loaded.
+    """
+    if args is None:
+        load = 'import {0}\n'.format(module)
+    else:
+        load = (
+            'import runpy\n'
+            'sys.argv = [{0!r}] + {1!r}\n'
+            'try:\n'
+            '    runpy.run_module({0!r}, run_name="__main__", alter_sys=True)\n'
+            'except SystemExit:\n'
+            '    pass\n'
+        ).format(module, args)
+    code = (
+        'import sys, importlib.util\n' + load +
+        'print()\n'
+        'print(" ".join(m for m in {0!r} if m in sys.modules and '
+        'not isinstance(sys.modules[m], importlib.util._LazyModule)))'
+    ).format(HEAVY_MODULES)
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=_env(),
+                                capture_output=True, text=True, check=True)
+    # The last line; a script may print before it
+    return result.stdout.splitlines()[-1].split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure bot and CLI cold start time.')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per scenario')
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Maximum allowed cold start in seconds')
+    args = parser.parse_args()
+
+    try:
+        baseline = measure(AIOGRAM_BASELINE, args.runs)
+    except subprocess.CalledProcessError:
+        baseline = 0.0
+
+    failed = False
+    print(f"{'scenario':<30} {'median, s':>10} {'own, s':>10}")
+    for name, scenario in SCENARIOS:
+        try:
+            elapsed = measure(scenario, args.runs)
+        except subprocess.CalledProcessError:
+            print(f"{name:<30} {'failed':>10}")
+            failed = True
+            continue
+        own = elapsed - baseline if 'bot' in name else elapsed
+        over = own > args.budget
+        failed = failed or over
+        print(f"{name:<30} {elapsed:>10.3f} {own:>10.3f}{'  OVER BUDGET' if over else ''}")
+    print(f"{'aiogram import (baseline)':<30} {baseline:>10.3f}")
+
+    for name, module, module_args in (('tgbot.parse_tools', 'tgbot.parse_tools', None),
+                                      ('csv_to_sql --list-sources', 'tgbot.csv_to_sql',
+                                       ['--list-sources'])):
+        heavy = loaded_heavy_modules(module, module_args)
+        if heavy:
+            print(f"Heavy modules loaded by {name}: {', '.join(heavy)}")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
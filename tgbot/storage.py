@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Pluggable FSM and cache storage for the bot.
+
+By default conversation state and the search cache live in process memory.
+When GOSTBOT_REDIS_URL is set, both are kept in Redis instead, so several
+bot replicas (e.g. behind a webhook) share them and survive restarts.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import json
+import os
+import time
+from typing import Any, Optional
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+REDIS_URL = os.environ.get('GOSTBOT_REDIS_URL')
+
+# How long search results stay cached, in seconds
+CACHE_TTL = 600
+
+
+class BaseCache(ABC):
+    """Asynchronous key-value cache for JSON-serializable values."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: int = CACHE_TTL):
+        """Cache a value for ttl seconds."""
+
+    async def close(self):
+        """Release the connection, if any."""
+
+
+class MemoryCache(BaseCache):
+    """Per-process LRU cache with expiry."""
+
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._items: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int = CACHE_TTL):
+        self._items[key] = (time.monotonic() + ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+
+class RedisCache(BaseCache):
+    """Cache shared by all bot replicas, stored in Redis as JSON."""
+
+    def __init__(self, redis, prefix: str = 'gostbot:cache:'):
+        self.redis = redis
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: int = CACHE_TTL):
+        await self.redis.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_redis(url: str):
+    """Create an asyncio Redis client (requires the 'redis' package)."""
+    from redis.asyncio import Redis
+    return Redis.from_url(url)
+
+
+def create_fsm_storage(redis=None) -> BaseStorage:
+    """
+    Create the FSM storage for the Dispatcher.
+
+    Args:
+        redis: Redis (or fakeredis) client; None keeps state in memory.
+
+    Returns:
+        RedisStorage sharing state across replicas, or MemoryStorage.
+    """
+    if redis is None:
+        return MemoryStorage()
+    from aiogram.fsm.storage.redis import RedisStorage
+    return RedisStorage(redis=redis)
+
+
+def create_cache(redis=None) -> BaseCache:
+    """
+    Create the search cache.
+
+    Args:
+        redis: Redis (or fakeredis) client; None caches per process.
+
+    Returns:
+        RedisCache or MemoryCache.
+    """
+    if redis is None:
+        return MemoryCache()
+    return RedisCache(redis)
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+"""
+Subscriptions to GOSTs and change notifications.
+
+Subscriptions are indexed by normalized designation. After a refresh the
+notification job reads the changed designations from the version history
+once, looks their subscribers up through that index and groups the changes
+per chat, so every chat gets one message however many of its standards
+changed. Messages are sent in small concurrent batches paced to stay under
+Telegram's broadcast limit.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+import logging
+from typing import Dict, Iterable, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+import aiohttp
+
+from tgbot import history
+from tgbot.models import Subscription, chunks, session
+from tgbot.normalize import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Telegram delivers about 30 messages per second to different chats
+NOTIFY_BATCH_SIZE = 25
+NOTIFY_BATCH_INTERVAL = 1.0
+# Telegram's limit on the length of a message
+MESSAGE_MAX_CHARS = 4096
+
+
+def subscribe(chat_id: int, gost_name: str) -> bool:
+    """
+    Subscribe a chat to changes of a GOST.
+
+    Args:
+        chat_id: Telegram chat id.
+        gost_name: GOST name as stored in the database.
+
+    Returns:
+        False if the chat was already subscribed.
+    """
+    name_norm = normalize_text(gost_name)
+    subscribed = session.query(Subscription.id).filter(
+        Subscription.name_norm == name_norm,
+        Subscription.chat_id == chat_id,
+    ).first()
+    if subscribed:
+        return False
+    session.add(Subscription(chat_id=chat_id, name_norm=name_norm, name=gost_name,
+                             created_at=datetime.utcnow()))
+    session.commit()
+    return True
+
+
+def unsubscribe(chat_id: int, gost_name: str) -> bool:
+    """
+    Remove a chat's subscription to a GOST.
+
+    Args:
+        chat_id: Telegram chat id.
+        gost_name: GOST name, in any spelling normalize_text() folds.
+
+    Returns:
+        False if the chat was not subscribed.
+    """
+    deleted = session.query(Subscription).filter(
+        Subscription.name_norm == normalize_text(gost_name),
+        Subscription.chat_id == chat_id,
+    ).delete(synchronize_session=False)
+    session.commit()
+    return bool(deleted)
+
+
+def list_subscriptions(chat_id: int) -> List[str]:
+    """Get the names of the GOSTs a chat is subscribed to."""
+    return [name for name, in session.query(Subscription.name).filter(
+        Subscription.chat_id == chat_id
+    ).order_by(Subscription.name)]
+
+
+def subscribers_of(name_norms: Iterable[str]) -> Dict[str, List[int]]:
+    """
+    Look up the subscribers of many GOSTs at once.
+
+    Args:
+        name_norms: Normalized GOST names.
+
+    Returns:
+        Mapping of normalized name to subscribed chat ids.
+    """
+    subscribers = defaultdict(list)
+    for chunk in chunks(list(name_norms)):
+        rows = session.query(Subscription.name_norm, Subscription.chat_id).filter(
+            Subscription.name_norm.in_(chunk)
+        )
+        for name_norm, chat_id in rows:
+            subscribers[name_norm].append(chat_id)
+    return subscribers
+
+
+def build_notifications(since: datetime) -> Dict[int, List[str]]:
+    """
+    Compute the change notifications of every subscribed chat.
+
+    Args:
+        since: Start of the refresh (UTC); changes made since are reported.
+
+    Returns:
+        Mapping of chat id to messages to send it.
+    """
+    changes = {}
+    for version in history.changed_since(since):
+        changes[version.name_norm] = f"Изменён {version.name}:\n{version.description}"
+    for version in history.removed_since(since):
+        changes[version.name_norm] = f"Исключён из каталога {version.name}"
+
+    lines = defaultdict(list)
+    for name_norm, chat_ids in subscribers_of(changes).items():
+        for chat_id in chat_ids:
+            lines[chat_id].append(changes[name_norm])
+    return {chat_id: split_message(chat_lines) for chat_id, chat_lines in lines.items()}
+
+
+def split_message(lines: List[str], max_chars: int = MESSAGE_MAX_CHARS) -> List[str]:
+    """Join lines into as few messages as Telegram's length limit allows."""
+    messages = []
+    current = ''
+    for line in lines:
+        line = line[:max_chars]
+        if current and len(current) + 2 + len(line) > max_chars:
+            messages.append(current)
+            current = ''
+        current = current + '\n\n' + line if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+async def _send(bot: Bot, chat_id: int, text: str) -> bool:
+    while True:
+        try:
+            await bot.send_message(chat_id, text)
+            return True
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+        except TelegramForbiddenError:
+            # The user blocked the bot: stop notifying them
+            session.query(Subscription).filter(
+                Subscription.chat_id == chat_id
+            ).delete(synchronize_session=False)
+            session.commit()
+            return False
+        except (TelegramAPIError, aiohttp.ClientError) as e:
+            # E.g. "chat not found": skip this message, not the rest of the batch
+            logger.error(f"Failed to notify chat {chat_id}: {e}")
+            return False
+
+
+async def send_notifications(bot: Bot, notifications: Dict[int, List[str]],
+                             batch_size: int = NOTIFY_BATCH_SIZE,
+                             interval: float = NOTIFY_BATCH_INTERVAL) -> int:
+    """
+    Send notifications in rate-limited batches.
+
+    Args:
+        bot: Bot to send with.
+        notifications: Mapping from build_notifications().
+        batch_size: Messages sent concurrently per batch.
+        interval: Minimum time between the starts of two batches, in seconds.
+
+    Returns:
+        Number of messages delivered.
+    """
+    messages = [(chat_id, text)
+                for chat_id, texts in notifications.items() for text in texts]
+    sent = 0
+    loop = asyncio.get_running_loop()
+    for start in range(0, len(messages), batch_size):
+        started = loop.time()
+        batch = messages[start:start + batch_size]
+        results = await asyncio.gather(*(_send(bot, chat_id, text) for chat_id, text in batch))
+        sent += sum(results)
+        if start + batch_size < len(messages):
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+    return sent
+
+
+async def notify_changes(bot: Bot, since: datetime) -> int:
+    """
+    Notify subscribers about the GOSTs changed or removed since a point in time.
+
+    Args:
+        bot: Bot to send with.
+        since: Start of the refresh (UTC).
+
+    Returns:
+        Number of messages delivered.
+    """
+    notifications = build_notifications(since)
+    sent = await send_notifications(bot, notifications)
+    logger.info(f"Sent {sent} change notifications to {len(notifications)} chats")
+    return sent
+
+
+async def run_notifications(since: datetime) -> int:
+    """Notify subscribers using the bot token from settings.py."""
+    from tgbot.settings import API_TOKEN
+
+    bot = Bot(token=API_TOKEN)
+    try:
+        return await notify_changes(bot, since)
+    finally:
+        await bot.session.close()